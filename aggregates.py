@@ -0,0 +1,172 @@
+import os
+import argparse
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import stores
+
+# Everything the Overview charts plot, precomputed from the Parquet files into
+# small tables under ./data/aggregates/<version>/, a versioned store (stores.py)
+# on the inputs' size and mtime plus this file, so rebuilding the data or changing
+# an aggregate starts a new store, and the dashboard never scans review.parquet
+# itself.
+# Usage: python aggregates.py [--force]
+
+AGG_DIR = "./data/aggregates"
+INPUTS = [
+    "./data/business.parquet",
+    "./data/business_features.parquet",
+    "./data/review.parquet",
+    "./data/tip.parquet",
+]
+
+def dataset_version() -> str:
+    return stores.dataset_version(INPUTS, __file__)
+
+def store_dir(version: str | None = None) -> str:
+    return os.path.join(AGG_DIR, version or dataset_version())
+
+# working_days struct -> (open, close) in fractional hours and whole open/close
+# hours, one row per business and day it has hours for
+def working_hours(business: pa.Table) -> pd.DataFrame:
+    working_days = business.column("working_days").combine_chunks()
+    frames = []
+    for i, day in enumerate(working_days.type):
+        hours = working_days.field(i)
+        valid = pc.and_(working_days.is_valid(), hours.is_valid()).to_numpy(zero_copy_only=False)
+        if not valid.any():
+            continue
+        bounds = pc.list_flatten(hours.filter(pa.array(valid)))
+        minutes = pc.cast(bounds, pa.int64()).to_numpy() // 60_000_000
+        frames.append(pd.DataFrame({
+            "business_id": np.asarray(business.column("business_id"))[valid],
+            "Day": day.name,
+            "open_minutes": minutes[0::2],
+            "close_minutes": minutes[1::2],
+        }))
+    columns = ["business_id", "Day", "open_minutes", "close_minutes"]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+def business_points(df_b: pd.DataFrame, hours: pd.DataFrame, tips: pd.DataFrame) -> pd.DataFrame:
+    # total_hours counts a day shorter than an hour (e.g. 0:0-0:0) as open around the clock
+    span = (hours["close_minutes"] - hours["open_minutes"]) / 60
+    span = span.where(span >= 1, span + 24)
+    total_hours = span.groupby(hours["business_id"]).sum()
+    tips_count = tips.groupby("business_id").size()
+
+    points = df_b[["business_id", "name", "latitude", "longitude", "stars", "review_count"]].copy()
+    points["tips"] = points["business_id"].map(tips_count).fillna(0).astype("int64")
+    points["total_hours"] = points["business_id"].map(total_hours)
+    return points
+
+def top_franchises(df_b: pd.DataFrame) -> pd.DataFrame:
+    franchise_summary = df_b.groupby("name", as_index=False).agg(
+        avg_stars=("stars", "mean"),
+        num_locations=("business_id", "count"),
+        total_reviews=("review_count", "sum")
+    )
+
+    bins = [0, 3, 6, 10, 20, 50]
+    labels = ["1-3", "4-6", "7-10", "11-20", "21+"]
+    franchise_summary["location_group"] = pd.cut(franchise_summary["num_locations"], bins=bins, labels=labels, right=True)
+    return franchise_summary.sort_values(by="num_locations", ascending=False).head(15)
+
+def feature_aggregates(df_b: pd.DataFrame, df_f: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    feature_counts = df_f.sum().sort_values(ascending=True)
+
+    feature_sums = df_f.sum().astype(float)
+    feature_stars = df_b.set_index("business_id")["stars"].reindex(df_f.index)
+    avg_stars_per_feature = df_f.astype(float).mul(feature_stars, axis=0).sum() / feature_sums.replace(0, np.nan)
+    avg_stars_per_feature = avg_stars_per_feature.dropna().sort_values()
+
+    return {
+        "feature_counts": feature_counts.rename_axis("feature").reset_index(name="count"),
+        "avg_stars_per_feature": avg_stars_per_feature.rename_axis("feature").reset_index(name="avg_stars"),
+    }
+
+def hours_aggregates(df_b: pd.DataFrame, hours: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    avg_hours = pd.DataFrame({
+        "Day": hours["Day"],
+        "Open": hours["open_minutes"] // 60,
+        "Close": hours["close_minutes"] // 60,
+    }).groupby("Day")[["Open", "Close"]].mean().reset_index()
+
+    duration = (hours["close_minutes"] - hours["open_minutes"]) / 60
+    duration = duration.where(duration >= 0, duration + 24)
+    weekly_hours = duration.groupby(hours["business_id"]).sum().rename("Duration").reset_index()
+    weekly_hours = weekly_hours.merge(df_b[["business_id", "stars"]], on="business_id")
+    weekly_hours["stars_grouped"] = np.floor(weekly_hours["stars"]).astype(int)
+
+    return {
+        "avg_hours": avg_hours,
+        "weekly_hours": weekly_hours[weekly_hours["Duration"] > 0].reset_index(drop=True),
+    }
+
+# only the review columns the charts use are read
+def review_aggregates(path: str) -> Dict[str, pd.DataFrame]:
+    db_r = pd.read_parquet(path, columns=["stars", "useful", "funny", "cool", "date"])
+
+    corr = db_r[["stars", "useful", "funny", "cool"]].corr()
+    corr = corr.mask(np.triu(np.ones_like(corr, dtype=bool))).round(2)
+
+    year = pd.to_datetime(db_r["date"]).dt.year.rename("date")
+    return {
+        "review_stars": db_r.groupby("stars").size().reset_index(name="count"),
+        "review_corr": corr.rename_axis("metric").reset_index(),
+        "avg_stars_per_year": db_r["stars"].groupby(year).mean().reset_index(),
+    }
+
+def tip_aggregates(tips: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    month = pd.to_datetime(tips["date"]).dt.to_period("M").rename("date")
+    tips_over_time = tips.groupby(month).size().reset_index(name="tip_count")
+    tips_over_time["date"] = tips_over_time["date"].dt.to_timestamp()
+    return {"tips_over_time": tips_over_time}
+
+def compute_aggregates() -> Dict[str, pd.DataFrame]:
+    business = pq.read_table("./data/business.parquet",
+                             columns=["business_id", "name", "latitude", "longitude", "stars", "review_count", "working_days"])
+    df_b = business.drop(["working_days"]).to_pandas()
+    df_f = pd.read_parquet("./data/business_features.parquet").set_index("business_id")
+    tips = pd.read_parquet("./data/tip.parquet", columns=["business_id", "date"])
+    hours = working_hours(business)
+
+    return {
+        "business_points": business_points(df_b, hours, tips),
+        "top_franchises": top_franchises(df_b),
+        **feature_aggregates(df_b, df_f),
+        **hours_aggregates(df_b, hours),
+        **review_aggregates("./data/review.parquet"),
+        **tip_aggregates(tips),
+    }
+
+def build_store(force: bool = False) -> str:
+    version = dataset_version()
+    target = store_dir(version)
+    if os.path.isdir(target) and not force:
+        return target
+    return stores.write_store(AGG_DIR, version, compute_aggregates())
+
+def load_store(version: str | None = None) -> Dict[str, pd.DataFrame]:
+    target = store_dir(version)
+    if not os.path.isdir(target):
+        target = build_store()
+    return stores.read_store(target)
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Precompute the Overview chart aggregates")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the store for this version exists")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    target = build_store(args.force)
+    print(f"Aggregates written to {target}")
+    return 0
+
+if __name__ == "__main__":
+    print("exit code:", main())
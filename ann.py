@@ -0,0 +1,179 @@
+import os
+import argparse
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+import embeddings
+
+# Approximate nearest-neighbor search over the review and tip embeddings, for
+# "which reviews are closest to this one" queries. Each table gets an IVF-PQ
+# index, ann.npz, stored next to its projection (so it follows the same version).
+# The vectors are L2-normalized, so L2 order is cosine order, and grouped into
+# inverted lists around k-means centroids. Each vector's residual to its centroid
+# is product-quantized to one byte per SUBVECTOR dimensions, 48 bytes for a
+# 384-dimensional vector instead of 1,536, plus one float with the part of its
+# distance that does not depend on the query. A query scores only the codes of the
+# `nprobe` closest lists, through one table of its inner products with every
+# codebook entry. It then re-ranks the best candidates exactly against the
+# float16 vectors of the embedding cache, which stay memory-mapped on disk.
+# Usage: python ann.py [--table review tip] [--force]
+
+SUBVECTOR = 8 # dimensions per code byte
+CODEBOOK = 256 # centroids per subspace (one uint8 code)
+TRAIN_SAMPLE = 50_000 # vectors the list centroids are trained on
+CODEBOOK_SAMPLE = 20_000 # and the codebooks
+MAX_LISTS = 4096
+NPROBE = 8
+RERANK = 10 # candidates re-ranked exactly per requested neighbor
+CHUNK = 65_536 # rows assigned at once when encoding
+SEED = 0
+
+def index_path(table: str, model: str = embeddings.MODEL) -> str:
+    return os.path.join(embeddings.build_store(table, model), "ann.npz")
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, np.float32)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+# zero-pads the dimensions to a multiple of SUBVECTOR
+def pad(vectors: np.ndarray) -> np.ndarray:
+    extra = -vectors.shape[1] % SUBVECTOR
+    return np.pad(vectors, ((0, 0), (0, extra))) if extra else vectors
+
+def train_kmeans(data: np.ndarray, k: int) -> np.ndarray:
+    model = KMeans(n_clusters=min(k, len(data)), n_init=1, max_iter=20, random_state=SEED).fit(data)
+    return model.cluster_centers_.astype(np.float32)
+
+# index of the closest centroid of every row
+def assign(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    sq_norms = (centroids ** 2).sum(1)
+    return np.concatenate([
+        np.argmin(sq_norms - 2 * data[start:start + CHUNK] @ centroids.T, axis=1)
+        for start in range(0, len(data), CHUNK)
+    ]) if len(data) else np.empty(0, np.int64)
+
+def encode(data: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    codes = np.empty((len(data), len(codebooks)), np.uint8)
+    for j, codebook in enumerate(codebooks):
+        codes[:, j] = assign(data[:, j * SUBVECTOR:(j + 1) * SUBVECTOR], codebook)
+    return codes
+
+def decode(codes: np.ndarray, codebooks: np.ndarray) -> np.ndarray:
+    return codebooks[np.arange(len(codebooks)), codes].reshape(len(codes), -1)
+
+# vectors -> index arrays: centroids (lists, dim), codebooks (subspaces, codes,
+# SUBVECTOR), and the rows (`ids`), codes and `terms` of every list, list by
+# list, list i spanning offsets[i]:offsets[i + 1]. With x ~ c + r (centroid plus
+# decoded residual), |q - x|^2 = |q - c|^2 - 2 q.r + (|r|^2 + 2 c.r); terms holds
+# the last part, so a query only needs its q.r table.
+def train_index(vectors: np.ndarray) -> Dict[str, np.ndarray]:
+    data = pad(normalize(vectors))
+    rng = np.random.default_rng(SEED)
+    sample = data[rng.choice(len(data), min(len(data), TRAIN_SAMPLE), replace=False)]
+
+    centroids = train_kmeans(sample, int(np.clip(round(4 * np.sqrt(len(data))), 1, MAX_LISTS)))
+    sample = sample[:CODEBOOK_SAMPLE]
+    residuals = sample - centroids[assign(sample, centroids)]
+    codebooks = np.stack([
+        train_kmeans(residuals[:, j * SUBVECTOR:(j + 1) * SUBVECTOR], CODEBOOK)
+        for j in range(data.shape[1] // SUBVECTOR)
+    ])
+
+    lists = assign(data, centroids)
+    codes = np.empty((len(data), len(codebooks)), np.uint8)
+    terms = np.empty(len(data), np.float32)
+    for start in range(0, len(data), CHUNK):
+        stop = min(start + CHUNK, len(data))
+        coarse = centroids[lists[start:stop]]
+        codes[start:stop] = encode(data[start:stop] - coarse, codebooks)
+        decoded = decode(codes[start:stop], codebooks)
+        terms[start:stop] = (decoded ** 2).sum(1) + 2 * (coarse * decoded).sum(1)
+    order = np.argsort(lists, kind="stable")
+    return {
+        "centroids": centroids,
+        "codebooks": codebooks,
+        "offsets": np.concatenate([[0], np.cumsum(np.bincount(lists, minlength=len(centroids)))]),
+        "ids": order.astype(np.int32),
+        "codes": codes[order],
+        "terms": terms[order],
+    }
+
+# the `k` rows closest to each query and their cosine similarity, best first
+# (-1 / nan past the rows found); with `vectors` (rows -> their vectors) the
+# k * RERANK best candidates are re-scored exactly
+def search(index: Dict[str, np.ndarray], queries: np.ndarray, k: int = 10, nprobe: int = NPROBE,
+           vectors: Callable[[np.ndarray], np.ndarray] | None = None) -> Tuple[np.ndarray, np.ndarray]:
+    centroids, codebooks, offsets = index["centroids"], index["codebooks"], index["offsets"]
+    subspaces = np.arange(len(codebooks))
+    queries = pad(normalize(np.atleast_2d(queries)))
+    coarse = 1 + (centroids ** 2).sum(1) - 2 * queries @ centroids.T # |q - c|^2, |q| = 1
+    probes = np.argsort(coarse, axis=1)[:, :nprobe]
+
+    found_ids = np.full((len(queries), k), -1, np.int64)
+    found_scores = np.full((len(queries), k), np.nan, np.float32)
+    for q, (query, lists) in enumerate(zip(queries, probes)):
+        positions = np.concatenate([np.arange(offsets[i], offsets[i + 1]) for i in lists])
+        if not len(positions):
+            continue
+        table = (query.reshape(len(codebooks), 1, SUBVECTOR) * codebooks).sum(-1)
+        distances = (np.repeat(coarse[q, lists], np.diff(offsets)[lists]) + index["terms"][positions]
+                     - 2 * table[subspaces, index["codes"][positions]].sum(1))
+        candidates = index["ids"][positions]
+
+        keep = min(len(candidates), k * RERANK if vectors is not None else k)
+        best = np.argpartition(distances, keep - 1)[:keep]
+        candidates, scores = candidates[best], 1 - distances[best] / 2
+        if vectors is not None:
+            candidates = np.sort(candidates)
+            exact = normalize(vectors(candidates))
+            scores = exact @ query[:exact.shape[1]]
+        top = np.argsort(-scores, kind="stable")[:k]
+        found_ids[q, :len(top)], found_scores[q, :len(top)] = candidates[top], scores[top]
+    return found_ids, found_scores
+
+def build_index(table: str, model: str = embeddings.MODEL, force: bool = False) -> str:
+    path = index_path(table, model)
+    if os.path.exists(path) and not force:
+        return path
+    rows = embeddings.cache_rows(embeddings.load_hashes(table, model), model)
+    index = train_index(embeddings.read_cache(model)[1][rows])
+    # rows of the table -> rows of the embedding cache, for the exact re-ranking
+    index["cache_rows"] = rows.astype(np.int32)
+    with open(path + ".tmp", "wb") as file:
+        np.savez(file, **index)
+    os.replace(path + ".tmp", path)
+    print(f"{table}: indexed {len(rows)} vectors in {len(index['centroids'])} lists "
+          f"({sum(array.nbytes for array in index.values()) / 2**20:.1f} MB)")
+    return path
+
+# the index arrays plus `cache`, the memory-mapped embedding cache the exact
+# re-ranking reads from
+def load_index(table: str, model: str = embeddings.MODEL) -> Dict[str, np.ndarray]:
+    with np.load(build_index(table, model)) as stored:
+        index = dict(stored)
+    index["cache"] = embeddings.read_cache(model)[1]
+    return index
+
+# rows of the indexed table most similar to each query vector (see search),
+# re-ranked on their cached vectors
+def similar(index: Dict[str, np.ndarray], queries: np.ndarray, k: int = 10,
+            nprobe: int = NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+    return search(index, queries, k, nprobe, lambda rows: index["cache"][index["cache_rows"][rows]])
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the nearest-neighbor index over the review and tip embeddings")
+    parser.add_argument("--table", nargs="+", choices=embeddings.TABLES, default=embeddings.TABLES,
+                        help="tables to index")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the index for this version exists")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    for table in args.table:
+        print(f"{table} index written to {build_index(table, force=args.force)}")
+    return 0
+
+if __name__ == "__main__":
+    print("exit code:", main())
@@ -1,5 +1,7 @@
 import streamlit as st
 
+from pages import registry
+
 
 st.sidebar.header("Business Intelligence")
 st.sidebar.text("@ Universidad Panamericana")
@@ -26,3 +28,8 @@ pg = st.navigation(pages, expanded=True)
 st.title("Florida Gyms")
 
 pg.run()
+
+# what this server process keeps loaded for all sessions
+with st.sidebar.expander("Resident datasets"):
+    st.dataframe(registry.resident(), hide_index=True)
+    st.caption(f"Arrow memory pool: {registry.arrow_allocated_mb()} MB")
@@ -0,0 +1,68 @@
+import sys
+import time
+
+import numpy as np
+
+import ann
+
+# Recall and latency of the IVF-PQ index (ann.py) against exact brute-force
+# cosine search, for several nprobe values, with and without the exact
+# re-ranking on the stored vectors. The vectors are random but shaped like
+# all-MiniLM-L6-v2 embeddings of reviews: 384 dimensions, grouped in topics and
+# subtopics with some noise on top.
+# Usage: python -m benchmarks.bench_ann [n_vectors ...]
+
+SIZES = [10_000, 100_000]
+DIM = 384
+TOPICS = 200
+SUBTOPICS = 20 # per topic
+QUERIES = 200
+K = 10
+NPROBES = [1, 4, 8, 16, 32]
+
+def synthetic_vectors(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(TOPICS, DIM)).astype(np.float32)
+    subtopics = np.repeat(topics, SUBTOPICS, axis=0) + 0.5 * rng.normal(size=(TOPICS * SUBTOPICS, DIM)).astype(np.float32)
+    vectors = subtopics[rng.integers(0, len(subtopics), n)] + 0.3 * rng.normal(size=(n, DIM)).astype(np.float32)
+    return vectors.astype(np.float16)
+
+def brute_force(vectors: np.ndarray, queries: np.ndarray, k: int) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    scores = ann.normalize(queries) @ vectors.T
+    top = np.argsort(-scores, axis=1)[:, :k]
+    return top, (time.perf_counter() - start) / len(queries)
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(np.intersect1d(f, t)) / len(t) for f, t in zip(found, truth)]))
+
+def main(argv: list[str]) -> int:
+    sizes = [int(arg) for arg in argv] or SIZES
+    for n in sizes:
+        stored = synthetic_vectors(n + QUERIES)
+        vectors, queries = stored[:n], stored[n:].astype(np.float32)
+        normalized = ann.normalize(vectors)
+
+        start = time.perf_counter()
+        index = ann.train_index(vectors)
+        build_s = time.perf_counter() - start
+        index_mb = sum(array.nbytes for array in index.values()) / 2**20
+        truth, brute_s = brute_force(normalized, queries, K)
+        print(f"{n} vectors: index built in {build_s:.1f}s, {len(index['centroids'])} lists, "
+              f"{index_mb:.1f} MB (float32 vectors {normalized.nbytes / 2**20:.1f} MB); "
+              f"brute force {brute_s * 1000:.2f} ms/query (batched)")
+
+        print(f"{'nprobe':>7} {'PQ ms':>8} {'recall@10':>10} {'rerank ms':>10} {'recall@10':>10}")
+        for nprobe in NPROBES:
+            start = time.perf_counter()
+            found, _ = ann.search(index, queries, K, nprobe)
+            pq_s = (time.perf_counter() - start) / len(queries)
+            start = time.perf_counter()
+            reranked, _ = ann.search(index, queries, K, nprobe, lambda rows: vectors[rows])
+            rerank_s = (time.perf_counter() - start) / len(queries)
+            print(f"{nprobe:>7} {pq_s * 1000:>8.2f} {recall(found, truth):>10.3f} "
+                  f"{rerank_s * 1000:>10.2f} {recall(reranked, truth):>10.3f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,73 @@
+import sys
+import time
+import random
+import pandas as pd
+import pyarrow as pa
+from datetime import datetime
+
+from export import WEEKDAYS, hours_to_wide, working_days_column
+
+# Compares the vectorized business-hours merge in export.py against the original
+# per-row strptime/dict implementation on synthetic business_hours tables.
+# Usage: python -m benchmarks.bench_hours [n_businesses ...]
+
+SIZES = [1_000, 10_000, 100_000]
+
+def legacy_working_days(df_business_h: pd.DataFrame) -> pd.DataFrame:
+    elements = []
+    for key, value in zip(df_business_h["day"], df_business_h["open_close"]):
+        open_hour, close_hour = value.split("-")
+        dt_open = datetime.strptime(open_hour, "%H:%M")
+        dt_close = datetime.strptime(close_hour, "%H:%M")
+        elements.append({key: tuple((dt_open.time(), dt_close.time()))})
+
+    s = pd.Series(elements)
+
+    df_b = pd.concat([df_business_h['business_id'], s], axis=1)
+    df_b = df_b.rename(columns = {0: "working_days"})
+
+    df_b["working_days"] = df_b["working_days"].apply(lambda x: dict(x))
+
+    return (
+        df_b.groupby("business_id", sort=False, as_index=False)
+            .agg({"working_days": lambda lst: {k: v for d in lst for k, v in d.items()}})
+    )
+
+def vectorized_working_days(df_business_h: pd.DataFrame) -> tuple[pd.Index, pa.StructArray]:
+    wide = hours_to_wide(df_business_h)
+    return wide.index, working_days_column(wide)
+
+def synthetic_hours(n_businesses: int, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_businesses):
+        for day in rng.sample(WEEKDAYS, rng.randint(1, 7)):
+            rows.append((f"b{i:07d}", day, f"{rng.randint(0, 12)}:{rng.choice([0, 30])}-{rng.randint(12, 23)}:{rng.choice([0, 15])}"))
+    return pd.DataFrame(rows, columns=["business_id", "day", "open_close"])
+
+def normalize(working_days: dict) -> dict:
+    return {day: tuple(hours) for day, hours in working_days.items() if hours is not None}
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main(argv: list[str]) -> int:
+    sizes = [int(arg) for arg in argv] or SIZES
+    print(f"{'businesses':>10} {'rows':>9} {'legacy s':>9} {'vector s':>9} {'speedup':>8}")
+    for n in sizes:
+        df_hours = synthetic_hours(n)
+        legacy, legacy_s = timed(legacy_working_days, df_hours)
+        vector, vector_s = timed(vectorized_working_days, df_hours)
+
+        expected = dict(zip(legacy["business_id"], map(normalize, legacy["working_days"])))
+        actual = dict(zip(vector[0], map(normalize, vector[1].to_pylist())))
+        if expected != actual:
+            print(f"Mismatch between implementations for {n} businesses")
+            return 1
+        print(f"{n:>10} {len(df_hours):>9} {legacy_s:>9.3f} {vector_s:>9.3f} {legacy_s / vector_s:>7.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
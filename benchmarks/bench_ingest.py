@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import contextlib
+from typing import Any, Dict, List
+
+import jsons
+from benchmarks.synthetic import write_dataset
+
+# Loads a synthetic dump into SQLite once per setting of jsons.PROFILES, each
+# setting adding one knob of the bulk profile on top of the previous one, and
+# reports rows/sec per source plus the deferred index build.
+# Usage: python -m benchmarks.bench_ingest [n_businesses]
+
+BUSINESSES = 2_000
+
+def settings_ladder() -> List[tuple]:
+    default, bulk = jsons.PROFILES["default"], jsons.PROFILES["bulk"]
+    ladder = [("default", default)]
+    profile = {**default, "pragmas": dict(default["pragmas"])}
+    for pragma in ("synchronous", "cache_size", "temp_store"):
+        profile = {**profile, "pragmas": {**profile["pragmas"], pragma: bulk["pragmas"][pragma]}}
+        ladder.append((f"+{pragma}={bulk['pragmas'][pragma]}", profile))
+    profile = {**profile, "defer_indexes": True}
+    ladder.append(("+deferred indexes", profile))
+    profile = {**profile, "batch_bytes": bulk["batch_bytes"]}
+    ladder.append((f"+batch_bytes={bulk['batch_bytes'] >> 20}MB", profile))
+    return ladder
+
+def table_rows(tables: List[str]) -> int:
+    con = sqlite3.connect(jsons.DB_NAME)
+    rows = sum(con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables)
+    con.close()
+    return rows
+
+def load(profile: Dict[str, Any]) -> Dict[str, float]:
+    if os.path.exists(jsons.DB_NAME):
+        os.remove(jsons.DB_NAME)
+    rates = {}
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        jsons.create_db(profile["defer_indexes"])
+        for source, (_, _, tables) in jsons.SOURCES.items():
+            source_start = time.perf_counter()
+            jsons.populate_table(source, profile=profile)
+            rates[source] = table_rows(tables) / (time.perf_counter() - source_start)
+        index_start = time.perf_counter()
+        if profile["defer_indexes"]:
+            jsons.create_deferred_indexes()
+        rates["index s"] = time.perf_counter() - index_start
+    rates["total s"] = time.perf_counter() - start
+    return rates
+
+def main(argv: List[str]) -> int:
+    businesses = int(argv[0]) if argv else BUSINESSES
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        lines = write_dataset(root, businesses)
+        print(f"Synthetic dump: {', '.join(f'{n} {source}' for source, n in lines.items())} lines")
+        os.chdir(root) # jsons.py resolves its paths relative to the working directory
+        os.makedirs(os.path.dirname(jsons.DB_NAME), exist_ok=True)
+        try:
+            columns = list(jsons.SOURCES) + ["index s", "total s"]
+            print(f"{'setting':<26}" + "".join(f"{column:>12}" for column in columns))
+            for name, profile in settings_ladder():
+                rates = load(profile)
+                print(f"{name:<26}" + "".join(
+                    f"{rates[column]:>12.2f}" if column.endswith(" s") else f"{rates[column]:>12,.0f}"
+                    for column in columns
+                ))
+        finally:
+            os.chdir(cwd)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
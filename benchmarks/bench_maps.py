@@ -0,0 +1,119 @@
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+import folium
+import branca.colormap as cm
+from folium.plugins import MarkerCluster
+
+import spatial
+from maps import MAP_CENTER, MAP_ZOOM, base_map, build_map, map_layer
+
+# Compares the GeoJSON/FastMarkerCluster map layers of the Overview page against
+# the original one-folium-object-per-gym loops, and against serving only the
+# default viewport from the spatial index: build + render time and the size of
+# the HTML shipped to the browser, on synthetic business_points tables.
+# Usage: python -m benchmarks.bench_maps [n_businesses ...]
+
+SIZES = [300, 3_000, 30_000]
+
+def get_color(stars) -> str:
+    if stars > 4: return "green"
+    elif stars > 3: return "lightgreen"
+    elif stars > 2: return "orange"
+    elif stars > 1: return "red"
+    return "purple"
+
+def legacy_star_map(agg):
+    df_b = agg["business_points"]
+    m1 = folium.Map(location=MAP_CENTER, zoom_start=9, tiles="cartodb positron")
+    for idx, row in df_b.iterrows():
+        folium.Marker(
+            location=[row["latitude"], row["longitude"]],
+            tooltip=row["name"],
+            popup=folium.Popup(f"<b>{row['name']}</b><br>Rating: {row['stars']} ⭐<br>", max_width=300),
+            icon=folium.Icon(color=get_color(row["stars"]), prefix="fa", icon="dumbbell")
+        ).add_to(m1)
+    return m1
+
+def legacy_cluster_map(agg):
+    df_b = agg["business_points"]
+    m2 = folium.Map(location=MAP_CENTER, zoom_start=9, tiles="cartodb positron")
+    marker_cluster = MarkerCluster().add_to(m2)
+    for idx, row in df_b.iterrows():
+        folium.CircleMarker(
+            location=[row["latitude"], row["longitude"]],
+            radius=5 + row["review_count"]/50,
+            color=get_color(row["stars"]),
+            fill=True,
+            fill_opacity=0.7,
+            tooltip=f"{row['name']}<br>Stars: {row['stars']}<br>Reviews: {row['review_count']}<br>Tips: {row['tips']}"
+        ).add_to(marker_cluster)
+    return m2
+
+def legacy_review_map(agg):
+    df_b = agg["business_points"]
+    m4 = folium.Map(location=MAP_CENTER, zoom_start=9, tiles="cartodb positron")
+    colormap = cm.linear.YlOrRd_09.scale(df_b["review_count"].min(), df_b["review_count"].max())
+    for _, row in df_b.iterrows():
+        folium.CircleMarker(
+            location=[row["latitude"], row["longitude"]],
+            radius=max(3, row["review_count"] ** 0.7),
+            color=colormap(row["review_count"]),
+            fill=True,
+            fill_color=colormap(row["review_count"]),
+            fill_opacity=0.6,
+            tooltip=row["name"],
+            popup=folium.Popup(f"<b>{row['name']}</b><br>Reviews: {row['review_count']}<br>", max_width=300)
+        ).add_to(m4)
+    colormap.add_to(m4)
+    return m4
+
+MAPS = {
+    "star_map": legacy_star_map,
+    "cluster_map": legacy_cluster_map,
+    "review_map": legacy_review_map,
+}
+
+def synthetic_points(n_businesses: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "business_id": [f"b{i:07d}" for i in range(n_businesses)],
+        "name": rng.choice(["Anytime Fitness", "Planet Fitness", "Gold's Gym", "CrossFit 9"], n_businesses),
+        "latitude": rng.uniform(25.0, 30.5, n_businesses),
+        "longitude": rng.uniform(-87.0, -80.0, n_businesses),
+        "stars": rng.integers(2, 11, n_businesses) / 2,
+        "review_count": rng.integers(5, 500, n_businesses),
+        "tips": rng.integers(0, 30, n_businesses),
+    })
+
+def render(builder, agg) -> tuple[int, float]:
+    start = time.perf_counter()
+    html = builder(agg).get_root().render()
+    return len(html.encode()), time.perf_counter() - start
+
+def viewport_map(key, agg, index):
+    m = base_map(key, agg)
+    bounds = spatial.viewport(None, MAP_CENTER, MAP_ZOOM)
+    map_layer(key, agg, index, bounds, MAP_ZOOM).add_to(m)
+    return m
+
+def main(argv: list[str]) -> int:
+    warnings.filterwarnings("ignore")
+    sizes = [int(arg) for arg in argv] or SIZES
+    print(f"{'map':<12} {'businesses':>10} {'legacy s':>9} {'legacy KB':>10} {'layer s':>9} {'layer KB':>10}"
+          f" {'view s':>9} {'view KB':>10}")
+    for n in sizes:
+        agg = {"business_points": synthetic_points(n)}
+        index = spatial.build_index(agg["business_points"])
+        for key, legacy in MAPS.items():
+            legacy_bytes, legacy_s = render(legacy, agg)
+            layer_bytes, layer_s = render(lambda agg: build_map(key, agg), agg)
+            view_bytes, view_s = render(lambda agg: viewport_map(key, agg, index), agg)
+            print(f"{key:<12} {n:>10} {legacy_s:>9.3f} {legacy_bytes / 1024:>10,.0f} {layer_s:>9.3f} {layer_bytes / 1024:>10,.0f}"
+                  f" {view_s:>9.3f} {view_bytes / 1024:>10,.0f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,63 @@
+import sys
+import time
+from math import radians, sin, cos, sqrt, atan2
+
+import numpy as np
+import networkx as nx
+
+import spatial
+
+# Compares the franchise network of the Franchise page (spatial.franchise_network:
+# vectorized haversine + scipy MST, Delaunay candidates above DENSE_MST_MAX)
+# against the original scalar haversine double loop feeding networkx, on random
+# Florida locations, and checks both trees have the same total length.
+# Usage: python -m benchmarks.bench_mst [n_locations ...]
+
+SIZES = [10, 100, 1_000, 10_000]
+LEGACY_MAX = 2_000 # the n^2 Python loop takes minutes beyond this
+
+def haversine(lat1, lon1, lat2, lon2):
+    R = 6371
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
+    return 2 * R * atan2(sqrt(a), sqrt(1-a))
+
+def legacy_network(lats, lons) -> np.ndarray:
+    n = len(lats)
+    G = nx.Graph()
+    for i in range(n):
+        for j in range(i + 1, n):
+            dist = haversine(lats[i], lons[i], lats[j], lons[j])
+            G.add_edge(i, j, weight=dist)
+    mst = nx.minimum_spanning_tree(G)
+    return np.array(list(mst.edges()), dtype="int64").reshape(-1, 2)
+
+def synthetic_locations(n: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    return rng.uniform(25.0, 30.5, n), rng.uniform(-87.0, -80.0, n)
+
+def timed(builder, lats, lons) -> tuple[np.ndarray, float]:
+    start = time.perf_counter()
+    edges = builder(lats, lons)
+    return edges, time.perf_counter() - start
+
+def tree_length(lats, lons, edges) -> float:
+    return float(spatial.haversine_pairs(lats, lons, edges[:, 0], edges[:, 1]).sum())
+
+def main(argv: list[str]) -> int:
+    sizes = [int(arg) for arg in argv] or SIZES
+    print(f"{'locations':>10} {'legacy s':>10} {'new s':>10} {'speedup':>9} {'same length':>12}")
+    for n in sizes:
+        lats, lons = synthetic_locations(n)
+        edges, new_s = timed(spatial.franchise_network, lats, lons)
+        if n > LEGACY_MAX:
+            print(f"{n:>10} {'skipped':>10} {new_s:>10.4f} {'':>9} {'':>12}")
+            continue
+        legacy_edges, legacy_s = timed(legacy_network, lats, lons)
+        same = np.isclose(tree_length(lats, lons, edges), tree_length(lats, lons, legacy_edges))
+        print(f"{n:>10} {legacy_s:>10.4f} {new_s:>10.4f} {legacy_s / new_s:>8.0f}x {str(same):>12}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import time
+
+import numpy as np
+import polars as pl
+from sklearn.feature_extraction.text import CountVectorizer
+
+import ngrams
+
+# Compares the word-cloud n-gram counts of nlp.py (ngrams.count_ngrams: one
+# tokenization per review, uni/bi/trigrams of both buckets in a single pass)
+# against the original six CountVectorizer fits, on synthetic reviews drawn from a
+# Zipfian vocabulary, and checks both give the same top 30 lists.
+# Usage: python -m benchmarks.bench_ngrams [n_reviews ...]
+
+SIZES = [10_000, 100_000]
+VOCABULARY = 20_000
+TOP_K, MIN_DF, MAX_DF = 30, 5, 0.9
+
+def synthetic_reviews(n: int, seed: int = 0) -> list[tuple[str, str]]:
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(VOCABULARY)])
+    weights = 1 / np.arange(1, VOCABULARY + 1)
+    lengths = rng.integers(20, 200, n)
+    tokens = words[rng.choice(VOCABULARY, lengths.sum(), p=weights / weights.sum())]
+    texts = [" ".join(doc) for doc in np.split(tokens, np.cumsum(lengths)[:-1])]
+    return [("bad" if stars <= 2 else "good", text) for stars, text in zip(rng.integers(1, 5, n), texts)]
+
+def legacy_top_ngrams(texts, ngram_range, stop_words):
+    vect = CountVectorizer(ngram_range=ngram_range, stop_words=list(stop_words), min_df=MIN_DF, max_df=MAX_DF)
+    X = vect.fit_transform(texts)
+    pairs = list(zip(vect.get_feature_names_out(), X.sum(axis=0).A1))
+    pairs.sort(key=lambda x: x[1], reverse=True)
+    return [(term, int(freq)) for term, freq in pairs[:TOP_K]]
+
+def legacy(docs, stop_words):
+    return {
+        (bucket, n): legacy_top_ngrams([text for b, text in docs if b == bucket], (n, n), stop_words)
+        for bucket in ("bad", "good") for n in ngrams.NGRAM_SIZES
+    }
+
+def single_pass(docs, stop_words):
+    frame = pl.DataFrame({"bucket": [bucket for bucket, _ in docs], "text": [text for _, text in docs]})
+    counts = ngrams.count_ngrams(frame.iter_slices(ngrams.BATCH_ROWS), stop_words)
+    return {
+        (bucket, n): ngrams.top_ngrams(counts, bucket, n, TOP_K, MIN_DF, MAX_DF)
+        for bucket in ("bad", "good") for n in ngrams.NGRAM_SIZES
+    }
+
+# runs one counter in a child process: (top lists, seconds, peak RSS in MB of
+# that child only, generating the reviews included)
+def measured(method: str, n: int):
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        docs = synthetic_reviews(n)
+        start = time.perf_counter()
+        tops = METHODS[method](docs, ngrams.stop_words())
+        with os.fdopen(write, "w") as out:
+            json.dump({"seconds": time.perf_counter() - start, "tops": sorted(tops.items())}, out)
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as result:
+        result = json.load(result)
+    _, _, usage = os.wait4(pid, 0)
+    return json.dumps(result["tops"]), result["seconds"], usage.ru_maxrss / 1024
+
+METHODS = {"legacy": legacy, "single_pass": single_pass}
+
+def main(argv: list[str]) -> int:
+    sizes = [int(arg) for arg in argv] or SIZES
+    print(f"{'reviews':>9} {'legacy s':>9} {'legacy MB':>10} {'new s':>7} {'new MB':>7} {'speedup':>8} {'same top':>9}")
+    for n in sizes:
+        old, old_s, old_mb = measured("legacy", n)
+        new, new_s, new_mb = measured("single_pass", n)
+        print(f"{n:>9} {old_s:>9.2f} {old_mb:>10.0f} {new_s:>7.2f} {new_mb:>7.0f} {old_s / new_s:>7.1f}x {str(old == new):>9}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
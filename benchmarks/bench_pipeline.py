@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import time
+import shlex
+import sqlite3
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import pyarrow.parquet as pq
+
+from benchmarks.synthetic import SCALE_BUSINESSES, write_dataset
+
+# Runs the Makefile build (jsons.py -> processing.py -> export.py -> nlp.py) on a
+# synthetic dump in a scratch directory, one subprocess per stage, and appends
+# wall time, peak RSS and rows/sec of every stage to a JSON results file, so runs
+# on different commits can be compared. rows is what the stage reads: JSON lines
+# for jsons.py, database rows for processing.py/export.py, reviews for nlp.py.
+# Usage: python -m benchmarks.bench_pipeline [--scale 1.0] [--ingest-args "--profile bulk"]
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS = os.path.join(REPO, "benchmarks", "results.json")
+
+def db_rows(path: str) -> int:
+    con = sqlite3.connect(path)
+    tables = [row[0] for row in con.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' "
+        "AND name NOT IN ('ingest_progress', 'sqlite_sequence')"
+    )]
+    rows = sum(con.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables)
+    con.close()
+    return rows
+
+# runs one stage to completion; peak RSS comes from the rusage of that child only
+def run_stage(args: List[str], cwd: str, log) -> Dict[str, float]:
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, *args], cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with code {process.returncode}")
+    return {"wall_s": round(wall, 3), "peak_rss_mb": round(usage.ru_maxrss / 1024, 1)}
+
+def run_benchmark(scale: float, seed: int, ingest_args: List[str], log) -> Dict[str, Any]:
+    stages: Dict[str, Dict[str, Any]] = {}
+    with tempfile.TemporaryDirectory() as root:
+        lines = write_dataset(root, max(1, int(SCALE_BUSINESSES * scale)), seed=seed)
+        os.makedirs(os.path.join(root, "data", "outputs_nlp"))
+        db = os.path.join(root, "data", "gyms.db")
+        script = lambda name: os.path.join(REPO, name)
+
+        def stage(name: str, args: List[str], rows: int) -> None:
+            print(f"[{name}] running")
+            result = run_stage(args, root, log)
+            result.update(rows=rows, rows_per_s=round(rows / max(result["wall_s"], 1e-9), 1))
+            stages[name] = result
+
+        stage("jsons", [script("jsons.py"), *ingest_args], sum(lines.values()))
+        stage("processing", [script("processing.py")], db_rows(db))
+        stage("export", [script("export.py")], db_rows(db))
+        # the Makefile's rm/mv after export.py
+        subprocess.run([sys.executable, "-c", "import export; export.finalize_business()"],
+                       cwd=root, env={**os.environ, "PYTHONPATH": REPO}, stdout=log, check=True)
+        os.remove(db)
+        reviews = pq.ParquetFile(os.path.join(root, "data", "review.parquet")).metadata.num_rows
+        stage("nlp", [script("nlp.py")], reviews)
+
+    return {"lines": lines, "stages": stages}
+
+def git_commit() -> str | None:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+def load_results(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)
+
+def report(run: Dict[str, Any], previous: Dict[str, Any] | None) -> None:
+    print(f"{'stage':<12}{'wall s':>10}{'peak MB':>10}{'rows':>10}{'rows/sec':>12}{'vs last':>10}")
+    for name, result in run["stages"].items():
+        change = ""
+        if previous and name in previous["stages"]:
+            change = f"{result['wall_s'] / max(previous['stages'][name]['wall_s'], 1e-9) - 1:+.0%}"
+        print(f"{name:<12}{result['wall_s']:>10.2f}{result['peak_rss_mb']:>10.1f}"
+              f"{result['rows']:>10}{result['rows_per_s']:>12,.0f}{change:>10}")
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Time every build stage on a synthetic Yelp dump")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help=f"dataset size factor, 1.0 is {SCALE_BUSINESSES} businesses")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ingest-args", default="", help="extra arguments for jsons.py, e.g. \"--profile bulk\"")
+    parser.add_argument("--output", default=RESULTS, help="JSON file the run is appended to")
+    parser.add_argument("--log", default=os.devnull, help="file receiving the stages' own output")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    ingest_args = shlex.split(args.ingest_args)
+    with open(args.log, "w") as log:
+        result = run_benchmark(args.scale, args.seed, ingest_args, log)
+
+    run = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "scale": args.scale,
+        "seed": args.seed,
+        "ingest_args": ingest_args,
+        **result,
+    }
+    results = load_results(args.output)
+    # compare against the last run made with the same dataset and flags
+    previous = next((r for r in reversed(results)
+                     if (r["scale"], r["seed"], r["ingest_args"]) == (args.scale, args.seed, ingest_args)), None)
+    report(run, previous)
+
+    results.append(run)
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results appended to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
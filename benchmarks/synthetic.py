@@ -0,0 +1,168 @@
+import os
+import sys
+import json
+import random
+import argparse
+from typing import Any, Dict, List
+
+import jsons
+
+# Writes Yelp-shaped JSONL dumps with the fields jsons.py reads, under the same
+# file names, so the loaders can run against them from a scratch directory.
+# Attributes keep the dump's quirks (u'free', "None", dict-like strings), as
+# export.normalize_attributes has to handle them.
+# Usage: python -m benchmarks.synthetic OUT_DIR [--scale 1.0] [--seed 0]
+
+# businesses written per unit of --scale; reviews/tips/users grow with them
+SCALE_BUSINESSES = 1_000
+
+CITIES = [("Tampa", "FL"), ("Orlando", "FL"), ("Miami", "FL"), ("Philadelphia", "PA"), ("Nashville", "TN")]
+CATEGORIES = ["Gyms", "Fitness & Instruction", "Active Life", "Yoga", "Trainers", "Restaurants", "Bars"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# attribute -> raw values as they appear in the dump
+ATTRIBUTES = {
+    "BusinessAcceptsCreditCards": ["True", "False", "None"],
+    "ByAppointmentOnly": ["True", "False"],
+    "GoodForKids": ["True", "False", "None"],
+    "WheelchairAccessible": ["True", "False"],
+    "WiFi": ["u'free'", "'free'", "u'no'", "'no'", "None", "u'paid'"],
+    "NoiseLevel": ["u'quiet'", "u'average'", "'loud'"],
+    "RestaurantsPriceRange2": ["1", "2", "3", "None"],
+    "BusinessParking": [
+        "{'garage': False, 'street': False, 'validated': False, 'lot': False, 'valet': False}",
+        "{'garage': False, 'street': True, 'validated': False, 'lot': True, 'valet': False}",
+        "{'garage': None, 'street': None, 'lot': True}",
+        "{}",
+        "None",
+    ],
+    "Ambience": [
+        "{'romantic': False, 'intimate': False, 'classy': False, 'hipster': False, 'casual': True}",
+        "{u'divey': False, u'touristy': False, u'trendy': False}",
+        "None",
+    ],
+}
+
+WORDS = ("the gym was clean and the staff friendly but the equipment is old and the classes "
+         "are always crowded great trainers terrible parking would come back again").split()
+
+def fake_id(rng: random.Random) -> str:
+    return "".join(rng.choices("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789-_", k=22))
+
+def fake_date(rng: random.Random) -> str:
+    return (f"{rng.randint(2008, 2022)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} "
+            f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}")
+
+def fake_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+def fake_business(rng: random.Random, business_id: str) -> Dict[str, Any]:
+    city, state = rng.choice(CITIES)
+    return {
+        "business_id": business_id,
+        "name": f"{rng.choice(['Iron', 'Peak', 'Core', 'Pulse'])} {rng.choice(['Fitness', 'Gym', 'Athletics'])}",
+        "address": f"{rng.randint(1, 9999)} Main St",
+        "city": city,
+        "state": state,
+        "postal_code": f"{rng.randint(10000, 99999)}",
+        "latitude": rng.uniform(25.0, 41.0),
+        "longitude": rng.uniform(-87.0, -74.0),
+        "stars": rng.randint(2, 10) / 2,
+        "review_count": rng.randint(5, 500),
+        "is_open": rng.randint(0, 1),
+        # like the dump: attributes/categories/hours are sometimes null, attributes
+        # and hours are sparse, minutes are not zero-padded
+        "attributes": None if rng.random() < 0.1 else {
+            key: rng.choice(values) for key, values in ATTRIBUTES.items() if rng.random() < 0.7
+        },
+        "categories": None if rng.random() < 0.02 else ", ".join(rng.sample(CATEGORIES, rng.randint(1, 4))),
+        "hours": None if rng.random() < 0.15 else {
+            day: rng.choice(["0:0-0:0", f"{rng.randint(5, 10)}:{rng.choice([0, 30])}-{rng.randint(17, 23)}:{rng.choice([0, 30])}"])
+            for day in WEEKDAYS if rng.random() < 0.85
+        },
+    }
+
+def fake_review(rng: random.Random, business_id: str, user_id: str) -> Dict[str, Any]:
+    return {
+        "review_id": fake_id(rng),
+        "user_id": user_id,
+        "business_id": business_id,
+        "stars": float(rng.randint(1, 5)),
+        "useful": rng.randint(0, 10),
+        "funny": rng.randint(0, 5),
+        "cool": rng.randint(0, 5),
+        "text": fake_text(rng, rng.randint(20, 200)),
+        "date": fake_date(rng),
+    }
+
+def fake_tip(rng: random.Random, business_id: str, user_id: str) -> Dict[str, Any]:
+    return {
+        "user_id": user_id,
+        "business_id": business_id,
+        "text": fake_text(rng, rng.randint(3, 20)),
+        "date": fake_date(rng),
+        "compliment_count": rng.randint(0, 2),
+    }
+
+def fake_user(rng: random.Random, user_id: str) -> Dict[str, Any]:
+    user = {
+        "user_id": user_id,
+        "name": rng.choice(["Ana", "Ben", "Chloe", "Dev", "Eli"]),
+        "review_count": rng.randint(1, 300),
+        "yelping_since": fake_date(rng),
+        "useful": rng.randint(0, 100),
+        "funny": rng.randint(0, 50),
+        "cool": rng.randint(0, 50),
+        "elite": "",
+        "friends": ", ".join(fake_id(rng) for _ in range(rng.randint(0, 5))),
+        "fans": rng.randint(0, 20),
+        "average_stars": round(rng.uniform(1, 5), 2),
+    }
+    for compliment in ("hot", "more", "profile", "cute", "list", "note", "plain", "cool", "funny", "writer", "photos"):
+        user[f"compliment_{compliment}"] = rng.randint(0, 10)
+    return user
+
+# reviews/tips per business are averages; users are shared so that some write several reviews
+def write_dataset(root: str, businesses: int = 1_000, reviews_per_business: int = 20,
+                  tips_per_business: int = 4, seed: int = 0) -> Dict[str, int]:
+    rng = random.Random(seed)
+    paths = {source: os.path.join(root, path) for source, (path, _, _) in jsons.SOURCES.items()}
+    os.makedirs(os.path.dirname(paths["business"]), exist_ok=True)
+
+    business_ids = [fake_id(rng) for _ in range(businesses)]
+    user_ids = [fake_id(rng) for _ in range(max(1, businesses * reviews_per_business // 3))]
+    lines = {}
+
+    def write(source: str, records) -> None:
+        with open(paths[source], "w", encoding="utf-8") as file:
+            count = 0
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+                count += 1
+        lines[source] = count
+
+    write("business", (fake_business(rng, b) for b in business_ids))
+    write("review", (fake_review(rng, rng.choice(business_ids), rng.choice(user_ids))
+                     for _ in range(businesses * reviews_per_business)))
+    write("tip", (fake_tip(rng, rng.choice(business_ids), rng.choice(user_ids))
+                  for _ in range(businesses * tips_per_business)))
+    write("user", (fake_user(rng, u) for u in user_ids))
+    return lines
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Write a synthetic Yelp-shaped dump under OUT_DIR/yelp_json")
+    parser.add_argument("out_dir")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help=f"size factor, 1.0 writes {SCALE_BUSINESSES} businesses")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    lines = write_dataset(args.out_dir, max(1, int(SCALE_BUSINESSES * args.scale)), seed=args.seed)
+    for source, count in lines.items():
+        print(f"{source}: {count} lines")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import os
+import argparse
+from typing import Iterator, List
+
+import polars as pl
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import columnar
+import stores
+
+# Review texts normalized once for the word clouds and n-gram counts of nlp.py,
+# cached under ./data/clean_text/<version>/review.parquet (a versioned store, see
+# stores.py, on review.parquet and this module). The cleaning is what
+# nlp.py's normalize_text did per review in Python (lowercase, URLs and anything but
+# ASCII letters, whitespace and apostrophes replaced by spaces, runs of whitespace
+# collapsed, ends stripped), written as polars string expressions over a lazy scan
+# that is streamed into the store, so it runs vectorized on every core with bounded
+# memory. The store keeps the review columns the text stages filter on next to
+# text_clean, in the order of review.parquet; text_clean is null where text is.
+# Usage: python cleantext.py [--force]
+
+CLEAN_DIR = "./data/clean_text"
+INPUTS = [columnar.parquet_path("review")]
+COLUMNS = ["stars"] # review columns stored with text_clean
+URL_PATTERN = r"http\S+|www\.\S+"
+NON_LETTERS = r"[^a-zA-Z\s']"
+
+def dataset_version() -> str:
+    return stores.dataset_version(INPUTS, __file__)
+
+def store_dir(version: str | None = None) -> str:
+    return os.path.join(CLEAN_DIR, version or dataset_version())
+
+# text column -> cleaned text
+def clean(text: pl.Expr) -> pl.Expr:
+    return (text.cast(pl.String)
+                .str.to_lowercase()
+                .str.replace_all(URL_PATTERN, " ")
+                .str.replace_all(NON_LETTERS, " ")
+                .str.replace_all(r"\s+", " ")
+                .str.strip_chars())
+
+def write_store(version: str) -> str:
+    def write(tmp: str) -> None:
+        (columnar.scan("review")
+            .select(*COLUMNS, clean(pl.col("text")).alias("text_clean"))
+            .sink_parquet(os.path.join(tmp, "review.parquet")))
+    return stores.write_version(CLEAN_DIR, version, write)
+
+def build_store(force: bool = False) -> str:
+    version = dataset_version()
+    target = store_dir(version)
+    if os.path.isdir(target) and not force:
+        return target
+    return write_store(version)
+
+def clean_path() -> str:
+    return os.path.join(build_store(), "review.parquet")
+
+# lazy scan of the cleaned reviews, built first if missing or stale
+def scan() -> pl.LazyFrame:
+    return pl.scan_parquet(clean_path())
+
+# record batches of `columns` of the cleaned reviews, for one-pass scans
+def batches(columns: List[str] | None = None, batch_size: int = 65_536) -> Iterator[pa.RecordBatch]:
+    return pq.ParquetFile(clean_path()).iter_batches(batch_size=batch_size, columns=columns)
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Clean the review texts once for the NLP stage")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the store for this version exists")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    target = build_store(args.force)
+    print(f"Cleaned review texts written to {target}")
+    return 0
+
+if __name__ == "__main__":
+    print("exit code:", main())
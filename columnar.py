@@ -0,0 +1,36 @@
+import os
+from typing import Iterator, List
+
+import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Column-pruned, filtered access to the Parquet files for the dashboard pages and
+# nlp.py: callers name the columns they use and a row filter, and only those
+# columns and the row groups that can match are read. review.parquet and
+# tip.parquet are sorted by business_id with min/max statistics per row group
+# (see export.SORTED_TABLES), so a per-business or per-franchise filter skips
+# most of the file.
+
+DATA_DIR = "./data"
+
+def parquet_path(table: str) -> str:
+    return os.path.join(DATA_DIR, f"{table}.parquet")
+
+# lazy polars scan; select/filter on it are pushed down into the Parquet reader
+def scan(table: str) -> pl.LazyFrame:
+    return pl.scan_parquet(parquet_path(table))
+
+# eager read of `columns` (every column if None) of the rows matching `filters`,
+# a pyarrow expression or list of (column, op, value) tuples
+def read(table: str, columns: List[str] | None = None, filters: pc.Expression | list | None = None) -> pd.DataFrame:
+    return pq.read_table(parquet_path(table), columns=columns, filters=filters).to_pandas()
+
+# record batches of `columns`, streamed row group by row group for one-pass scans
+def batches(table: str, columns: List[str] | None = None, batch_size: int = 65_536) -> Iterator[pa.RecordBatch]:
+    return pq.ParquetFile(parquet_path(table)).iter_batches(batch_size=batch_size, columns=columns)
+
+def read_for_businesses(table: str, business_ids: List[str], columns: List[str] | None = None) -> pd.DataFrame:
+    return read(table, columns, pc.field("business_id").isin(pa.array(list(business_ids), pa.string())))
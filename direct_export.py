@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import json
+import argparse
+import sqlite3
+from typing import Any, Dict, List, Set
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import jsons
+from jsons import SOURCES, FILTER_KEYS, FILTER_STATE, FILTER_CATEGORY, BATCH_SIZE
+from jsons import new_batches, insert_batches, scan_business_ids, report_rate
+from export import SORTED_TABLES, IPC_TABLES, sort_parquet, write_ipc
+from export import merge_business_hours, merge_business_attr, finalize_business
+from schemas import SCHEMAS
+
+# Streams the Yelp JSON dumps straight into the final Parquet files, skipping the
+# JSON -> gyms.db -> prune -> Parquet round trip of jsons.py/processing.py/export.py.
+# Only the Florida gyms (and their reviews, tips and users) are ever materialized,
+# and at most BATCH_SIZE parsed lines per table are held in memory.
+
+OUT_DIR = "./data"
+
+# jsons.parse_tip builds rows in INSERT_SQL["tip"] order (tip_id being the dump
+# line number), which differs from the table layout
+ROW_COLUMNS = {
+    "tip": ["tip_id", "user_id", "business_id", "text", "date", "compliment_count"],
+}
+
+def to_record_batch(table: str, rows: List[tuple]) -> pa.RecordBatch:
+    schema = SCHEMAS[table]
+    names = ROW_COLUMNS.get(table, schema.names)
+    columns = dict(zip(names, map(list, zip(*rows)))) if rows else dict.fromkeys(names, [])
+    return pa.RecordBatch.from_arrays(
+        [pa.array(columns[field.name], type=field.type) for field in schema],
+        schema=schema
+    )
+
+def stream_source(source: str, keep: Set[str], writers: Dict[str, pq.ParquetWriter],
+                  con: sqlite3.Connection | None = None) -> Set[str]:
+    path, parse, tables = SOURCES[source]
+    key = FILTER_KEYS[source]
+    users = set()
+    rows = dict.fromkeys(tables, 0)
+    print(f"Streaming {source} into parquet")
+    start = time.perf_counter()
+
+    def flush(batches: Dict[str, list]) -> None:
+        for table, batch in batches.items():
+            writers[table].write_batch(to_record_batch(table, batch))
+            rows[table] += len(batch)
+        if con is not None:
+            insert_batches(con.cursor(), batches)
+            con.commit()
+
+    with open(path, "r", encoding="utf-8") as file:
+        batches = new_batches(source)
+        kept = 0
+
+        for line_num, line in enumerate(file, start=1):
+            data: Dict[str, Any] = json.loads(line)
+            if data[key] not in keep:
+                continue
+            if source in ("review", "tip"):
+                users.add(data["user_id"])
+            parse(data, batches, line_num)
+            kept += 1
+
+            if kept % BATCH_SIZE == 0:
+                flush(batches)
+                batches = new_batches(source)
+
+        flush(batches)
+
+    elapsed = time.perf_counter() - start
+    for table in tables:
+        report_rate(table, rows[table], elapsed)
+    return users
+
+def transform_json_to_parquet(sqlite: bool = False) -> None:
+    con = None
+    if sqlite:
+        if os.path.exists(jsons.DB_NAME):
+            os.remove(jsons.DB_NAME)
+        jsons.create_db()
+        con = sqlite3.connect(jsons.DB_NAME)
+
+    writers = {
+        table: pq.ParquetWriter(f"{OUT_DIR}/{table}.parquet", schema, compression="snappy")
+        for table, schema in SCHEMAS.items()
+    }
+    try:
+        keep = scan_business_ids()
+        print(f"Keeping {len(keep)} businesses in {FILTER_STATE} categorized as {FILTER_CATEGORY}")
+        stream_source("business", keep, writers, con)
+        users = stream_source("review", keep, writers, con) | stream_source("tip", keep, writers, con)
+        stream_source("user", users, writers, con)
+    finally:
+        for writer in writers.values():
+            writer.close()
+        if con is not None:
+            con.close()
+
+    # rows arrive in dump order; put review/tip in business_id order like export.py
+    for table in SORTED_TABLES:
+        sort_parquet(table, f"{OUT_DIR}/{table}.parquet")
+    for table in IPC_TABLES:
+        write_ipc(table)
+    merge_business_hours()
+    merge_business_attr()
+    finalize_business()
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build the Florida gyms Parquet files straight from the Yelp JSON dumps")
+    parser.add_argument("--sqlite", action="store_true",
+                        help=f"also write the filtered rows to {jsons.DB_NAME}")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    try:
+        transform_json_to_parquet(sqlite=args.sqlite)
+    except FileNotFoundError:
+        print("Some file(s) from the Yelp Database was(were) not found")
+        print("Make sure to download and store them with the specified format")
+        print("./yelp_json/{here the json files}")
+        print("https://business.yelp.com/data/resources/open-dataset/")
+        sys.exit(1)
+    print("Export complete...")
+    return 0
+
+if __name__ == "__main__":
+    print("exit code:", main())
@@ -0,0 +1,235 @@
+import os
+import json
+import hashlib
+import argparse
+from time import perf_counter
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import columnar
+import stores
+
+# Sentence embeddings of the review and tip texts, their 2D UMAP projection and
+# nearest neighbors, computed offline for the Atlas page under
+# ./data/embeddings/<model>/<table>/<version>/. The version hashes the model, the
+# UMAP settings and the SHA-256 of every text in row order, and projection.parquet
+# lines up row for row with the table. <model>/<table>.json records which version
+# matches the current Parquet file (size and mtime), so the page finds it without
+# reading or hashing any text.
+# The vectors themselves live in a content-addressed cache shared by both tables,
+# <model>/cache/: keys.bin holds the SHA-256 (hex) of each embedded text and
+# vectors.f16 the matching float16 rows, both append-only and memory-mapped. Only
+# texts missing from it are encoded, longest first in chunks of similar length
+# (less padding per batch), each chunk appended as it finishes, so adding 1% of
+# reviews embeds 1% of them and an interrupted run keeps what it encoded.
+# Usage: python embeddings.py [--table review tip] [--model NAME] [--device cpu]
+#                             [--threads N] [--workers N] [--force]
+
+EMBED_DIR = "./data/embeddings"
+MODEL = "all-MiniLM-L6-v2"
+TABLES = ["review", "tip"]
+BATCH_SIZE = 32
+CACHE_CHUNK = 4096 # texts encoded and appended to the cache per step
+KEY_DTYPE = "S64" # hex SHA-256
+# what compute_text_projection used on the page
+UMAP_ARGS = {"metric": "cosine", "n_neighbors": 15}
+
+def model_dir(model: str = MODEL) -> str:
+    return os.path.join(EMBED_DIR, model.replace("/", "--"))
+
+def pointer_path(table: str, model: str = MODEL) -> str:
+    return os.path.join(model_dir(model), f"{table}.json")
+
+# version of the table's Parquet file, checked against the pointer
+def source_version(table: str) -> str:
+    return stores.dataset_version([columnar.parquet_path(table)], __file__)
+
+def read_texts(table: str) -> List[str]:
+    return columnar.read(table, ["text"])["text"].fillna("").astype(str).tolist()
+
+def text_hashes(texts: List[str]) -> List[str]:
+    return [hashlib.sha256(text.encode()).hexdigest() for text in texts]
+
+def artifact_version(hashes: List[str], model: str) -> str:
+    digest = hashlib.sha256(json.dumps({"model": model, "umap": UMAP_ARGS}, sort_keys=True).encode())
+    for text_sha in hashes:
+        digest.update(text_sha.encode())
+    return digest.hexdigest()[:16]
+
+def cache_paths(model: str = MODEL) -> Tuple[str, str, str]:
+    cache = os.path.join(model_dir(model), "cache")
+    return (os.path.join(cache, "keys.bin"), os.path.join(cache, "vectors.f16"),
+            os.path.join(cache, "meta.json"))
+
+# (keys, vectors) of every complete cache row; a row whose key or vector write was
+# cut short by a crash is ignored and overwritten by the next append
+def read_cache(model: str = MODEL) -> Tuple[np.ndarray, np.ndarray | None]:
+    keys_path, vectors_path, meta_path = cache_paths(model)
+    if not os.path.exists(meta_path):
+        return np.empty(0, KEY_DTYPE), None
+    with open(meta_path) as file:
+        dim = json.load(file)["dim"]
+    # a key write cut short leaves keys.bin between two rows: map the complete ones only
+    key_rows = os.path.getsize(keys_path) // np.dtype(KEY_DTYPE).itemsize
+    keys = np.memmap(keys_path, dtype=KEY_DTYPE, mode="r", shape=(key_rows,)) if key_rows else np.empty(0, KEY_DTYPE)
+    rows = min(len(keys), os.path.getsize(vectors_path) // (2 * dim))
+    if not rows:
+        return keys[:0], np.empty((0, dim), np.float16)
+    return keys[:rows], np.memmap(vectors_path, dtype=np.float16, mode="r", shape=(rows, dim))
+
+def append_cache(model: str, keys: np.ndarray, vectors: np.ndarray) -> None:
+    keys_path, vectors_path, meta_path = cache_paths(model)
+    if not os.path.exists(meta_path):
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        for path in (keys_path, vectors_path):
+            open(path, "wb").close()
+        with open(meta_path, "w") as file:
+            json.dump({"model": model, "dim": vectors.shape[1], "dtype": "float16"}, file)
+    rows = len(read_cache(model)[0])
+    os.truncate(vectors_path, rows * 2 * vectors.shape[1])
+    os.truncate(keys_path, rows * np.dtype(KEY_DTYPE).itemsize)
+    # vectors first: a key is only complete once its vector is
+    with open(vectors_path, "ab") as file:
+        file.write(np.ascontiguousarray(vectors, np.float16).tobytes())
+    with open(keys_path, "ab") as file:
+        file.write(np.ascontiguousarray(keys, KEY_DTYPE).tobytes())
+
+def load_encoder(model: str = MODEL, device: str = "cpu", threads: int = 0):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    if threads:
+        torch.set_num_threads(threads)
+    return SentenceTransformer(model, device=device, trust_remote_code=True)
+
+# encodes the texts whose hash is not cached yet and appends them to the cache;
+# `workers` > 1 encodes on that many CPU processes, `threads` sets torch's
+# intra-op threads of this process
+def embed_missing(texts: List[str], hashes: List[str], model: str = MODEL, device: str = "cpu",
+                  threads: int = 0, workers: int = 1) -> int:
+    keys = np.array(hashes, KEY_DTYPE)
+    missing = np.flatnonzero(~np.isin(keys, read_cache(model)[0]))
+    missing = missing[np.unique(keys[missing], return_index=True)[1]]
+    if not len(missing):
+        return 0
+    lengths = np.array([len(texts[i]) for i in missing])
+    missing = missing[np.argsort(-lengths, kind="stable")]
+
+    encoder = load_encoder(model, device, threads)
+    pool = encoder.start_multi_process_pool(["cpu"] * workers) if workers > 1 else None
+    print(f"Embedding {len(missing)} new texts with {model} "
+          f"({f'{workers} processes' if pool else f'{device}, {torch_threads()} threads'})...")
+    start, done = perf_counter(), 0
+    try:
+        for chunk in np.array_split(missing, -(-len(missing) // CACHE_CHUNK)):
+            batch = [texts[i] for i in chunk]
+            if pool:
+                vectors = encoder.encode_multi_process(batch, pool, batch_size=BATCH_SIZE)
+            else:
+                vectors = encoder.encode(batch, batch_size=BATCH_SIZE, convert_to_numpy=True)
+            append_cache(model, keys[chunk], vectors)
+            done += len(chunk)
+            elapsed = perf_counter() - start
+            print(f"  {done}/{len(missing)} texts in {elapsed:.1f}s ({done / max(elapsed, 1e-9):,.0f} texts/sec)")
+    finally:
+        if pool:
+            encoder.stop_multi_process_pool(pool)
+    return done
+
+def torch_threads() -> int:
+    import torch
+    return torch.get_num_threads()
+
+# cache row of each of `hashes`
+def cache_rows(hashes: List[str], model: str = MODEL) -> np.ndarray:
+    rows = pd.Index(read_cache(model)[0]).get_indexer(np.array(hashes, KEY_DTYPE))
+    if (rows < 0).any():
+        raise KeyError(f"{int((rows < 0).sum())} texts are not in the {model} embedding cache")
+    return rows
+
+# float32 vectors of `hashes` in order, gathered from the cache
+def cached_vectors(hashes: List[str], model: str = MODEL) -> np.ndarray:
+    return read_cache(model)[1][cache_rows(hashes, model)].astype(np.float32)
+
+# vectors -> embedding_x, embedding_y and neighbors ({"distances", "ids"} per row,
+# ids being row positions), as embedding_atlas' own projection computes them
+def project(vectors: np.ndarray) -> pa.Table:
+    import umap
+    from umap.umap_ import nearest_neighbors
+    knn = nearest_neighbors(vectors, n_neighbors=UMAP_ARGS["n_neighbors"], metric=UMAP_ARGS["metric"],
+                            metric_kwds=None, angular=False, random_state=None)
+    xy = umap.UMAP(**UMAP_ARGS, precomputed_knn=knn).fit_transform(vectors)
+    k = knn[0].shape[1]
+    neighbors = pa.StructArray.from_arrays([
+        pa.FixedSizeListArray.from_arrays(pa.array(knn[1].ravel(), pa.float32()), k),
+        pa.FixedSizeListArray.from_arrays(pa.array(knn[0].ravel(), pa.int64()), k),
+    ], names=["distances", "ids"])
+    return pa.table({"embedding_x": xy[:, 0], "embedding_y": xy[:, 1], "neighbors": neighbors})
+
+def write_artifact(root: str, version: str, hashes: List[str], projection: pa.Table) -> str:
+    projection = projection.add_column(0, "text_sha", pa.array(hashes, pa.string()))
+    return stores.write_version(root, version,
+                                lambda tmp: pq.write_table(projection, os.path.join(tmp, "projection.parquet")))
+
+def build_store(table: str, model: str = MODEL, device: str = "cpu", force: bool = False,
+                threads: int = 0, workers: int = 1) -> str:
+    source, pointer = source_version(table), pointer_path(table, model)
+    root = os.path.join(model_dir(model), table)
+    if os.path.exists(pointer) and not force:
+        with open(pointer) as file:
+            current = json.load(file)
+        if current["source"] == source and os.path.isdir(os.path.join(root, current["version"])):
+            return os.path.join(root, current["version"])
+
+    texts = read_texts(table)
+    hashes = text_hashes(texts)
+    version = artifact_version(hashes, model)
+    target = os.path.join(root, version)
+    if force or not os.path.isdir(target):
+        embedded = embed_missing(texts, hashes, model, device, threads, workers)
+        print(f"{table}: {len(texts) - embedded} of {len(texts)} texts already embedded")
+        target = write_artifact(root, version, hashes, project(cached_vectors(hashes, model)))
+    else:
+        print(f"{table}: texts unchanged, reusing {target}")
+
+    with open(pointer + ".tmp", "w") as file:
+        json.dump({"source": source, "version": version}, file)
+    os.replace(pointer + ".tmp", pointer)
+    return target
+
+# embedding_x, embedding_y and neighbors of every row of `table`, in row order
+def load_projection(table: str, model: str = MODEL) -> pd.DataFrame:
+    target = build_store(table, model)
+    return pq.read_table(os.path.join(target, "projection.parquet"),
+                         columns=["embedding_x", "embedding_y", "neighbors"]).to_pandas()
+
+def load_hashes(table: str, model: str = MODEL) -> List[str]:
+    target = build_store(table, model)
+    return pq.read_table(os.path.join(target, "projection.parquet"), columns=["text_sha"]).column(0).to_pylist()
+
+def load_vectors(table: str, model: str = MODEL) -> np.ndarray:
+    return cached_vectors(load_hashes(table, model), model)
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Precompute the Atlas page's text embeddings and projections")
+    parser.add_argument("--table", nargs="+", choices=TABLES, default=TABLES, help="tables to embed")
+    parser.add_argument("--model", default=MODEL, help="sentence-transformers model name or path")
+    parser.add_argument("--device", default="cpu", help="torch device for the model, e.g. cuda:0")
+    parser.add_argument("--threads", type=int, default=0, help="torch CPU threads (default: torch's choice)")
+    parser.add_argument("--workers", type=int, default=1, help="encode on this many CPU processes")
+    parser.add_argument("--force", action="store_true",
+                        help="recompute the projection even if the texts did not change (cached vectors are reused)")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    for table in args.table:
+        target = build_store(table, args.model, args.device, args.force, args.threads, args.workers)
+        print(f"{table} embeddings written to {target}")
+    return 0
+
+if __name__ == "__main__":
+    print("exit code:", main())
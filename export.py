@@ -1,98 +1,264 @@
+import os
+import argparse
+from typing import Iterable
+from time import perf_counter
 import sqlite3
+import numpy as np
 import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from datetime import *
+from schemas import SCHEMAS
 
 TABLES = ["review", "user", "tip", "business", "business_categories", "business_attributes", "business_hours"]
 DB = "./data/gyms.db"
 OUT = "./data/yelp.parquet"
-CHUNKSIZE = 100_000
+CHUNKSIZE = 100_000 # rows fetched from SQLite per batch
+ROW_GROUP_SIZE = 100_000 # rows per parquet row group, buffered before each write
 
-def export_to_parquet() -> None:
+# tables written in key order, in smaller row groups, so the min/max statistics
+# of each group let readers filtering on business_id skip the rest of the file
+SORTED_TABLES = {
+    "review": ["business_id", "date"],
+    "tip": ["business_id", "date"],
+}
+SORTED_ROW_GROUP_SIZE = 20_000
+
+# read-mostly tables also written as uncompressed Arrow IPC (./data/<table>.arrow),
+# which the dashboard memory-maps instead of decoding the Parquet file
+IPC_TABLES = ["review", "tip"]
+
+# Writes record batches of `schema` to out_file, flushed every `row_group_size`
+# rows, so every row group but the last has exactly that many rows and peak
+# memory is about one row group. Returns the rows written.
+def write_row_groups(out_file: str, schema: pa.Schema, batches: Iterable[pa.RecordBatch],
+                     row_group_size: int = ROW_GROUP_SIZE) -> int:
+    rows = 0
+    pending, pending_rows = [], 0
+
+    with pq.ParquetWriter(out_file, schema, compression="snappy") as writer:
+        for batch in batches:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            rows += batch.num_rows
+
+            while pending_rows >= row_group_size:
+                buffered = pa.Table.from_batches(pending, schema)
+                writer.write_table(buffered.slice(0, row_group_size), row_group_size=row_group_size)
+                rest = buffered.slice(row_group_size)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+
+        if pending or rows == 0:
+            writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_size)
+    return rows
+
+# Streams one table out of SQLite: cursor batches of `chunksize` rows become Arrow
+# record batches with the table's fixed schema, and are flushed to the file every
+# `row_group_size` rows, so peak memory depends on those two knobs only.
+def export_table(con: sqlite3.Connection, table: str, out_file: str,
+                 chunksize: int = CHUNKSIZE, row_group_size: int = ROW_GROUP_SIZE) -> int:
+    schema = SCHEMAS[table]
+    order = f" ORDER BY {', '.join(SORTED_TABLES[table])}" if table in SORTED_TABLES else ""
+    cur: sqlite3.Cursor = con.execute(f"SELECT {', '.join(schema.names)} FROM {table}{order}")
+    start = perf_counter()
+
+    def record_batches():
+        while batch := cur.fetchmany(chunksize):
+            columns = list(zip(*batch))
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            )
+
+    rows = write_row_groups(out_file, schema, record_batches(), row_group_size)
+    elapsed = perf_counter() - start
+    print(f"{table}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+    return rows
+
+# streams ./data/<table>.parquet into an uncompressed Arrow IPC file, one record
+# batch at a time; processes that memory-map it share the same page-cache pages
+def write_ipc(table: str) -> None:
+    source = pq.ParquetFile(f"./data/{table}.parquet")
+    tmp = f"./data/{table}.arrow.tmp"
+    with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, source.schema_arrow) as writer:
+        for batch in source.iter_batches():
+            writer.write_batch(batch)
+    os.replace(tmp, f"./data/{table}.arrow")
+
+def export_to_parquet(chunksize: int = CHUNKSIZE, row_group_size: int = ROW_GROUP_SIZE,
+                      sorted_row_group_size: int = SORTED_ROW_GROUP_SIZE) -> None:
     con = sqlite3.connect(DB)
-    tables = pd.read_sql_query("SELECT name FROM sqlite_master WHERE type='table';", con)["name"].tolist()
     for table in TABLES:
         print(f"Exporting {table}...")
         out_file = f"./data/{table}.parquet"
-        pd.read_sql_query(f"SELECT * FROM {table}", con).to_parquet(
-            out_file, engine="pyarrow", index=False, compression="snappy"
-        )
+        export_table(con, table, out_file, chunksize,
+                     sorted_row_group_size if table in SORTED_TABLES else row_group_size)
+        if table in IPC_TABLES:
+            write_ipc(table)
         
     con.close()
     print("Export complete...")
 
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# business_hours rows ("7:0-22:30") -> one row per business_id with nullable
+# <day>_open / <day>_close columns holding minutes since midnight
+def hours_to_wide(df_hours: pd.DataFrame) -> pd.DataFrame:
+    parts = pc.extract_regex(
+        pa.array(df_hours["open_close"], pa.string()), r"(?P<oh>\d+):(?P<om>\d+)-(?P<ch>\d+):(?P<cm>\d+)"
+    )
+    field = lambda name: pc.cast(pc.struct_field(parts, name), pa.int16()).to_numpy()
+    opens = field("oh") * 60 + field("om")
+    closes = field("ch") * 60 + field("cm")
+
+    rows, business_ids = pd.factorize(df_hours["business_id"])
+    days = pd.Categorical(df_hours["day"], categories=WEEKDAYS).codes.astype("int64")
+    known = days >= 0
+    rows, days = rows[known], days[known]
+
+    # a repeated (business, day) keeps its last row, like the old dict merge did
+    values = np.zeros((len(business_ids), 2 * len(WEEKDAYS)), dtype="int16")
+    missing = np.ones(values.shape, dtype=bool)
+    values[rows, 2 * days], values[rows, 2 * days + 1] = opens[known], closes[known]
+    missing[rows, 2 * days] = missing[rows, 2 * days + 1] = False
+
+    columns = [f"{day}_{kind}" for day in WEEKDAYS for kind in ("open", "close")]
+    return pd.DataFrame(
+        {name: pd.arrays.IntegerArray(values[:, i], missing[:, i]) for i, name in enumerate(columns)},
+        index=pd.Index(business_ids, name="business_id")
+    )
+
+# Builds the working_days struct (day -> [open, close] as time64) straight from the
+# wide minutes, in the layout the per-row dict version used to get from pyarrow:
+# one field per day present in the data (alphabetical), a null field for a closed
+# day, a null struct for businesses without hours.
+def working_days_column(wide: pd.DataFrame) -> pa.StructArray:
+    days = sorted(day for day in WEEKDAYS if wide[f"{day}_open"].notna().any())
+    offsets = pa.array(np.arange(0, 2 * len(wide) + 1, 2, dtype="int32"))
+    fields = []
+    for day in days:
+        opens, closes = wide[f"{day}_open"], wide[f"{day}_close"]
+        micros = np.column_stack([
+            opens.fillna(0).to_numpy("int64"),
+            closes.fillna(0).to_numpy("int64")
+        ]).ravel() * 60_000_000
+        fields.append(pa.ListArray.from_arrays(
+            offsets, pa.array(micros, pa.time64("us")), mask=pa.array(opens.isna().to_numpy())
+        ))
+    return pa.StructArray.from_arrays(fields, names=days, mask=pa.array(wide.isna().all(axis=1).to_numpy()))
+
 def merge_business_hours() -> None:
     df_business = pd.read_parquet("./data/business.parquet")
     df_business_h = pd.read_parquet("./data/business_hours.parquet")
-    
-    elements = []
-    for key, value in zip(df_business_h["day"], df_business_h["open_close"]):
-        open_hour, close_hour = value.split("-")
-        dt_open = datetime.strptime(open_hour, "%H:%M")
-        dt_close = datetime.strptime(close_hour, "%H:%M")
-        elements.append({key: tuple((dt_open.time(), dt_close.time()))})
-    
-    s = pd.Series(elements)
-    
-    df_b = pd.concat([df_business_h['business_id'], s], axis=1)
-    df_b = df_b.rename(columns = {0: "working_days"})
-    
-    df_b["working_days"] = df_b["working_days"].apply(lambda x: dict(x))
-    
-    df_b = (
-        df_b.groupby("business_id", sort=False, as_index=False)
-            .agg({"working_days": lambda lst: {k: v for d in lst for k, v in d.items()}})
-    )
-    
-    df_merged = pd.merge(df_business, df_b, on="business_id", how="left")
-    
-    df_merged.to_parquet("./data/business_hours_merge.parquet")
+
+    wide = hours_to_wide(df_business_h)
+
+    table = pa.Table.from_pandas(df_business, preserve_index=False)
+    table = table.append_column("working_days", working_days_column(wide.reindex(df_business["business_id"])))
+    pq.write_table(table, "./data/business_hours_merge.parquet")
     print("Successful merge: business_hours -> business")
 
+DROPPED_ATTRIBUTES = ["RestaurantsPriceRange2"]
+
+# Raw attribute strings -> nullable booleans. Dict-like values ("{'garage': False, ...}")
+# are False only when every entry is False; values no rule recognizes become <NA>.
+def normalize_attributes(values: pd.Series) -> pd.Series:
+    arr = pa.array(values, pa.string())
+    colons = pc.count_substring(arr, ":").to_numpy()
+    falses = pc.count_substring(arr, "False").to_numpy()
+    is_dict = pc.match_substring(arr, "}").to_numpy(zero_copy_only=False)
+    conditions = [
+        values.eq("True").to_numpy(),
+        values.eq("False").to_numpy(),
+        is_dict & (colons == falses) & (colons > 0),
+        is_dict,
+        values.isin(["None", "u'no'"]).to_numpy(),
+        values.eq("u'free'").to_numpy(),
+    ]
+    choices = [1, 0, 0, 1, 0, 1]
+    flags = np.select(conditions, choices, default=-1)
+    return pd.Series(pd.arrays.BooleanArray(flags == 1, flags == -1), index=values.index)
+
+# business_attributes rows -> one row per business_id, one nullable boolean column
+# per attribute (alphabetical). <NA> means the attribute is missing or unreadable.
+def attributes_to_wide(df_attr: pd.DataFrame) -> pd.DataFrame:
+    flags = normalize_attributes(df_attr["attr_value"])
+    rows, business_ids = pd.factorize(df_attr["business_id"])
+    cols, keys = pd.factorize(df_attr["attr_key"], sort=True)
+    known = flags.notna().to_numpy()
+    rows, cols = rows[known], cols[known]
+
+    values = np.zeros((len(business_ids), len(keys)), dtype=bool)
+    missing = np.ones(values.shape, dtype=bool)
+    values[rows, cols] = flags.to_numpy(dtype=bool, na_value=False)[known]
+    missing[rows, cols] = False
+
+    return pd.DataFrame(
+        {key: pd.arrays.BooleanArray(values[:, i], missing[:, i]) for i, key in enumerate(keys)},
+        index=pd.Index(business_ids, name="business_id")
+    )
+
+# features struct (attribute -> bool or null) for every business in `business_ids`,
+# null for businesses without attributes
+def features_column(features: pd.DataFrame, business_ids: pd.Series) -> pa.StructArray:
+    aligned = features.reindex(business_ids)
+    return pa.StructArray.from_arrays(
+        [pa.array(aligned[key], pa.bool_()) for key in features.columns],
+        names=list(features.columns),
+        mask=pa.array(~business_ids.isin(features.index).to_numpy())
+    )
+
 def merge_business_attr() -> None:
     df_business_a = pd.read_parquet("./data/business_attributes.parquet")
-    df_business_m = pd.read_parquet("./data/business_hours_merge.parquet")
-    
-    df_business_a = df_business_a[df_business_a["attr_key"] != "RestaurantsPriceRange2"]
-    df_business_a = df_business_a.reset_index(drop=True)
-    
-    elements = []
-    for key, value in zip(df_business_a['attr_key'], df_business_a['attr_value']):
-        if value != "True" and value != "False":
-            if "{" and "}" in value:
-                if value.count(":") == value.count("False") and value.count(":"):
-                    value = "False"
-                else:
-                    value = "True"
-            elif value == "None":
-                value = "False"
-            elif value == "u'free'":
-                value = "True"
-            elif value == "u'no'":
-                value = "False"
-        if value == "True":
-            value = True
-        elif value == "False":
-            value = False
-        elements.append({key: value})
-    
-    s = pd.Series(elements)    
-    df_b = pd.concat([df_business_a['business_id'], s], axis=1)
-    df_b = df_b.rename(columns={0: "features"})
-    
-    df_b["features"] = df_b["features"].apply(lambda x: dict(x))
-    
-    df_b = (
-        df_b.groupby("business_id", sort=False, as_index=False)
-            .agg({"features": lambda lst: {k: v for d in lst for k, v in d.items()}})
-    )
-    
-    df_merged = pd.merge(df_business_m, df_b, on="business_id", how="left")
-    
-    df_merged.to_parquet("./data/business_merge.parquet")
+    table = pq.read_table("./data/business_hours_merge.parquet")
+
+    df_business_a = df_business_a[~df_business_a["attr_key"].isin(DROPPED_ATTRIBUTES)]
+    features = attributes_to_wide(df_business_a)
+    features.reset_index().to_parquet("./data/business_features.parquet", index=False)
+
+    table = table.append_column("features", features_column(features, table.column("business_id").to_pandas()))
+    pq.write_table(table, "./data/business_merge.parquet")
     print("Successful merge: business_attributes -> business")
 
-def main() -> int:
-    export_to_parquet()
+# rewrites a Parquet file in SORTED_TABLES order for writers that cannot emit it
+# sorted (direct_export.py); polars sorts out of core, so memory stays bounded.
+# Its output (large_string columns) is streamed back through write_row_groups
+# with the table's schema, so the file matches what export_table writes.
+def sort_parquet(table: str, path: str, row_group_size: int = SORTED_ROW_GROUP_SIZE) -> None:
+    schema = SCHEMAS[table]
+    sorted_path, tmp = f"{path}.sorted", f"{path}.tmp"
+    (pl.scan_parquet(path)
+       .sort(SORTED_TABLES[table], maintain_order=True)
+       .sink_parquet(sorted_path))
+    batches = (batch.cast(schema) for batch in pq.ParquetFile(sorted_path).iter_batches(batch_size=row_group_size))
+    write_row_groups(tmp, schema, batches, row_group_size)
+    os.remove(sorted_path)
+    os.replace(tmp, path)
+
+# intermediate files folded into business.parquet by the two merges
+MERGED_TABLES = ["business_attributes", "business_categories", "business_hours", "business_hours_merge"]
+
+# what the Makefile does after export.py: keep only the merged business.parquet
+def finalize_business() -> None:
+    for table in MERGED_TABLES:
+        os.remove(f"./data/{table}.parquet")
+    os.replace("./data/business_merge.parquet", "./data/business.parquet")
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export gyms.db to parquet and merge the business tables")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE,
+                        help="rows fetched from SQLite per batch")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE,
+                        help="rows per parquet row group")
+    parser.add_argument("--sorted-row-group-size", type=int, default=SORTED_ROW_GROUP_SIZE,
+                        help=f"rows per row group of the tables sorted by business_id ({', '.join(SORTED_TABLES)})")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    export_to_parquet(args.chunksize, args.row_group_size, args.sorted_row_group_size)
     merge_business_hours()
     merge_business_attr()
     return 0
@@ -0,0 +1,183 @@
+import os
+import argparse
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import columnar
+import stores
+
+# Per-franchise lookups for the Franchise page, precomputed under
+# ./data/franchises/<version>/ (a versioned store, see stores.py, on the
+# business/review files and this module). Businesses are stored grouped by
+# franchise name and their reviews grouped by business, with typed dates, so a
+# franchise is two contiguous row ranges: picking one costs O(its locations and
+# reviews) instead of a scan of every review. For the franchises the page lists
+# it also keeps a (franchise, business, month) cube of review counts and star
+# sums, rolled up to the monthly trend the page plots.
+# Usage: python franchises.py [--force] [--append NEW_REVIEWS.parquet]
+
+FRANCHISE_DIR = "./data/franchises"
+INPUTS = [
+    "./data/business.parquet",
+    "./data/review.parquet",
+]
+
+BUSINESS_COLUMNS = ["business_id", "name", "address", "latitude", "longitude", "stars", "review_count"]
+REVIEW_COLUMNS = ["business_id", "review_id", "stars", "date"]
+MIN_LOCATIONS = 3 # the Franchise page lists franchises with at least this many gyms
+CUBE_KEYS = ["name", "business_id", "month"]
+
+def dataset_version() -> str:
+    return stores.dataset_version(INPUTS, __file__)
+
+def store_dir(version: str | None = None) -> str:
+    return os.path.join(FRANCHISE_DIR, version or dataset_version())
+
+# businesses -> one row per franchise, in the page's value_counts order, with the
+# row ranges of its locations and of their reviews
+def franchise_ranges(businesses: pd.DataFrame, review_stop: np.ndarray) -> pd.DataFrame:
+    counts = businesses["name"].value_counts(sort=False)
+    business_stop = np.cumsum(counts.to_numpy())
+    business_start = business_stop - counts.to_numpy()
+    return pd.DataFrame({
+        "name": counts.index,
+        "num_locations": counts.to_numpy(),
+        "business_start": business_start,
+        "business_stop": business_stop,
+        "review_start": np.concatenate([[0], review_stop])[business_start],
+        "review_stop": review_stop[business_stop - 1],
+    })
+
+# reviews -> (franchise, business, month) review count and star sum, for the
+# franchises with at least MIN_LOCATIONS locations; sums rather than means so
+# later reviews can be added to it
+def rating_cube(businesses: pd.DataFrame, reviews: pd.DataFrame) -> pd.DataFrame:
+    locations = businesses.groupby("name")["business_id"].transform("size")
+    listed = businesses.loc[locations >= MIN_LOCATIONS].set_index("business_id")["name"]
+    names = reviews["business_id"].map(listed)
+    keep = (names.notna() & reviews["date"].notna()).to_numpy()
+    return pd.DataFrame({
+        "name": names[keep],
+        "business_id": reviews["business_id"][keep],
+        "month": reviews["date"][keep].dt.to_period("M").dt.to_timestamp(),
+        "stars": reviews["stars"][keep],
+    }).groupby(CUBE_KEYS, as_index=False).agg(review_count=("stars", "size"), sum_stars=("stars", "sum"))
+
+def append_reviews(cube: pd.DataFrame, businesses: pd.DataFrame, reviews: pd.DataFrame) -> pd.DataFrame:
+    return pd.concat([cube, rating_cube(businesses, reviews)]).groupby(CUBE_KEYS, as_index=False).sum()
+
+# cube -> one row per franchise and month with a review, plus the 3-review-month
+# rolling mean the page draws next to it
+def monthly_ratings(cube: pd.DataFrame) -> pd.DataFrame:
+    monthly = cube.groupby(["name", "month"], as_index=False)[["review_count", "sum_stars"]].sum()
+    monthly["avg_stars"] = monthly["sum_stars"] / monthly["review_count"]
+    monthly["rolling_avg"] = (monthly.groupby("name")["avg_stars"]
+                              .rolling(window=3, min_periods=1).mean().reset_index(level=0, drop=True))
+    return monthly
+
+# businesses in franchise order + reviews -> the stored tables, with the reviews
+# of unknown businesses dropped and the rest grouped by business, then date
+def index_tables(businesses: pd.DataFrame, reviews: pd.DataFrame, cube: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    businesses = businesses.copy()
+    position = pd.Index(businesses["business_id"]).get_indexer(reviews["business_id"])
+    reviews = reviews[position >= 0].assign(position=position[position >= 0])
+    reviews = reviews.sort_values(["position", "date"], kind="stable").reset_index(drop=True)
+
+    review_counts = np.bincount(reviews["position"], minlength=len(businesses))
+    review_stop = np.cumsum(review_counts)
+    businesses["review_start"] = review_stop - review_counts
+    businesses["review_stop"] = review_stop
+
+    return {
+        "franchises": franchise_ranges(businesses, review_stop),
+        "businesses": businesses,
+        "reviews": reviews.drop(columns="position"),
+        "cube": cube,
+        "monthly": monthly_ratings(cube),
+    }
+
+def compute_index() -> Dict[str, pd.DataFrame]:
+    business = columnar.read("business", BUSINESS_COLUMNS)
+    # value_counts order on the original file: what the page lists
+    order = business["name"].value_counts().index
+
+    businesses = business.sort_values("name", kind="stable", key=lambda names: names.map(
+        {name: i for i, name in enumerate(order)})).reset_index(drop=True)
+
+    reviews = columnar.read("review", REVIEW_COLUMNS)
+    reviews["date"] = pd.to_datetime(reviews["date"], errors="coerce")
+    return index_tables(businesses, reviews, rating_cube(businesses, reviews))
+
+def build_store(force: bool = False) -> str:
+    version = dataset_version()
+    target = store_dir(version)
+    if os.path.isdir(target) and not force:
+        return target
+    return stores.write_store(FRANCHISE_DIR, version, compute_index())
+
+def load_index(version: str | None = None) -> Dict[str, pd.DataFrame]:
+    target = store_dir(version)
+    if not os.path.isdir(target):
+        target = build_store()
+    index = stores.read_store(target)
+    index["franchises"] = index["franchises"].set_index("name", drop=False)
+    index["trends"] = {
+        name: trend.reset_index(drop=True) for name, trend in index["monthly"].groupby("name", sort=False)
+    }
+    return index
+
+# folds reviews that arrived after the build into every table of the current
+# store (reviews, row ranges, cube and monthly trend) without reading
+# review.parquet again; reviews whose review_id is already stored, or that belong
+# to no stored business, are skipped, so appending the same file twice is a no-op
+def append_store(path: str) -> str:
+    target = build_store()
+    index = stores.read_store(target)
+    businesses = index["businesses"]
+    reviews = pd.read_parquet(path, columns=REVIEW_COLUMNS).drop_duplicates("review_id")
+    reviews = reviews[~reviews["review_id"].isin(index["reviews"]["review_id"])
+                      & reviews["business_id"].isin(businesses["business_id"])]
+    reviews["date"] = pd.to_datetime(reviews["date"], errors="coerce")
+    if reviews.empty:
+        print("No new reviews to add")
+        return target
+
+    cube = append_reviews(index["cube"], businesses, reviews)
+    tables = index_tables(businesses, pd.concat([index["reviews"], reviews], ignore_index=True), cube)
+    target = stores.write_store(FRANCHISE_DIR, os.path.basename(target), tables)
+    print(f"Added {len(reviews)} reviews to the franchise index")
+    return target
+
+# franchises with at least `min_locations` gyms, most locations first
+def franchise_names(index: Dict[str, pd.DataFrame], min_locations: int = 1) -> List[str]:
+    franchises = index["franchises"]
+    return franchises.loc[franchises["num_locations"] >= min_locations, "name"].tolist()
+
+# (locations, reviews) of one franchise, both slices of the stored tables
+def franchise_slice(index: Dict[str, pd.DataFrame], name: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    row = index["franchises"].loc[name]
+    locations = index["businesses"].iloc[row["business_start"]:row["business_stop"]]
+    reviews = index["reviews"].iloc[row["review_start"]:row["review_stop"]]
+    return locations, reviews
+
+# monthly review count, average and 3-month rolling average of a listed franchise
+def franchise_trend(index: Dict[str, pd.DataFrame], name: str) -> pd.DataFrame:
+    return index["trends"][name]
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Precompute the per-franchise index of the Franchise page")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the index for this version exists")
+    parser.add_argument("--append", metavar="PARQUET",
+                        help="add the new reviews in this file (review.parquet columns) to the index")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    target = append_store(args.append) if args.append else build_store(args.force)
+    print(f"Franchise index written to {target}")
+    return 0
+
+if __name__ == "__main__":
+    print("exit code:", main())
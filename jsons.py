@@ -1,10 +1,19 @@
 import sys
+import os
+import time
+import argparse
+import multiprocessing as mp
 from concurrent.futures import ProcessPoolExecutor
 from concurrent.futures import wait
+from queue import Full
+from typing import Any, Dict, List, Set, Tuple
 import sqlite3
 import json
 
 BATCH_SIZE = 5000
+QUEUE_SIZE = 32 # parsed batches buffered between the parser pool and the writer
+WRITER_POLL = 1.0 # seconds between checks that the writer is still running
+LINE_CHUNK = 1 << 20 # bytes read at once when counting lines
 
 BUSINESS_JSON_PATH = "./yelp_json/yelp_academic_dataset_business.json"
 REVIEW_JSON_PATH = "./yelp_json/yelp_academic_dataset_review.json"
@@ -13,12 +22,48 @@ USER_JSON_PATH = "./yelp_json/yelp_academic_dataset_user.json"
 
 DB_NAME = "./data/gyms.db"
 
-def create_db() -> None:
+# SQLite settings for a load. "bulk" trades crash safety for speed: no fsyncs, a
+# 1 GB page cache, temp b-trees in memory, primary-key indexes on business/review/
+# user built once after the load instead of row by row, and batches sized by bytes
+# so short user lines and long review lines commit similar volumes. A crash can
+# still be resumed, but an OS crash or power loss can corrupt the database.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "pragmas": {"journal_mode": "WAL"},
+        "defer_indexes": False,
+        "batch_bytes": None,
+    },
+    "bulk": {
+        "pragmas": {"journal_mode": "WAL", "synchronous": "OFF", "cache_size": -1_048_576, "temp_store": "MEMORY"},
+        "defer_indexes": True,
+        "batch_bytes": 32 * 1024 * 1024,
+    },
+}
+
+# primary keys that become unique indexes under defer_indexes
+DEFERRED_KEYS = {
+    "business": "business_id",
+    "review": "review_id",
+    "user": "user_id",
+}
+
+# businesses kept by --florida-gyms (same rule as processing.drop_rows)
+FILTER_STATE = "FL"
+FILTER_CATEGORY = "Gyms"
+
+def connect(profile: Dict[str, Any] = PROFILES["default"]) -> sqlite3.Connection:
+    con: sqlite3.Connection = sqlite3.connect(DB_NAME, timeout=30)
+    for pragma, value in profile["pragmas"].items():
+        con.execute(f"PRAGMA {pragma}={value};")
+    return con
+
+def create_db(defer_indexes: bool = False) -> None:
     con: sqlite3.Connection = sqlite3.connect(DB_NAME)
     cur: sqlite3.Cursor = con.cursor()
-    cur.execute("""
+    pk = "" if defer_indexes else " PRIMARY KEY"
+    cur.execute(f"""
         CREATE TABLE IF NOT EXISTS business (
-            business_id   TEXT PRIMARY KEY,
+            business_id   TEXT{pk},
             name          TEXT,
             address       TEXT,
             city          TEXT,
@@ -58,9 +103,9 @@ def create_db() -> None:
         );
     """)
 
-    cur.execute("""
+    cur.execute(f"""
         CREATE TABLE IF NOT EXISTS review (
-            review_id    TEXT PRIMARY KEY,
+            review_id    TEXT{pk},
             user_id      TEXT NOT NULL,
             business_id  TEXT NOT NULL,
             stars        INTEGER NOT NULL,
@@ -74,9 +119,9 @@ def create_db() -> None:
         );    
     """)
 
-    cur.execute("""
+    cur.execute(f"""
         CREATE TABLE IF NOT EXISTS user (
-            user_id          TEXT PRIMARY KEY,
+            user_id          TEXT{pk},
             name             TEXT,
             review_count     INTEGER,
             yelping_since    TEXT,
@@ -112,288 +157,480 @@ def create_db() -> None:
         );
     """)
 
-    con.close()
-
-def populate_business_table() -> None:
-    con: sqlite3.Connection = sqlite3.connect(DB_NAME, timeout=30)
-    cur: sqlite3.Cursor = con.cursor()
-    cur.execute("PRAGMA journal_mode=WAL;")
-    print("Starting to populate business table")
-    with open(BUSINESS_JSON_PATH, "r") as file:
-        # omiting types for batches just because
-        # these are essentially list[tuples[...]] where ... are the different types within the business.json
-        business_batch = []
-        attr_batch = []
-        cat_batch = []
-        hours_batch = []
-
-        for line_num, line in enumerate(file, start=1):
-            data: Dict[str, Any] = json.loads(line)
-            business_batch.append((
-                data["business_id"],
-                data["name"],
-                data["address"],
-                data["city"],
-                data["state"],
-                data["postal_code"],
-                data["latitude"],
-                data["longitude"],
-                data["stars"],
-                data["review_count"],
-                data["is_open"]
-            ))
-            
-            if data.get("attributes"):
-                for k, v in data["attributes"].items():
-                    attr_batch.append((data["business_id"], k, str(v)))
-
-            if data.get("categories"):
-                for cat in data["categories"].split(", "):
-                    cat_batch.append((data["business_id"], cat))
-
-            if data.get("hours"):
-                for day, hours in data["hours"].items():
-                    hours_batch.append((data["business_id"], day, hours))
-
-            if line_num % BATCH_SIZE == 0:
-                cur.executemany("""
-                    INSERT INTO business (
-                        business_id, name, address, city, state, postal_code,
-                        latitude, longitude, stars, review_count, is_open
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, business_batch)
-
-                cur.executemany("""
-                    INSERT INTO business_attributes (business_id, attr_key, attr_value)
-                    VALUES (?, ?, ?)
-                """, attr_batch)
-
-                cur.executemany("""
-                    INSERT INTO business_categories (business_id, category)
-                    VALUES (?, ?)
-                """, cat_batch)
-
-                cur.executemany("""
-                    INSERT INTO business_hours (business_id, day, open_close)
-                    VALUES (?, ?, ?)
-                """, hours_batch)
-
-                con.commit()
-                business_batch, attr_batch, cat_batch, hours_batch = [], [], [], []
-
-        if business_batch:
-            cur.executemany("""
-                INSERT INTO business (
-                    business_id, name, address, city, state, postal_code,
-                    latitude, longitude, stars, review_count, is_open
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, business_batch)
-
-        if attr_batch:
-            cur.executemany("""
-                INSERT INTO business_attributes (business_id, attr_key, attr_value)
-                VALUES (?, ?, ?)
-            """, attr_batch)
-
-        if cat_batch:
-            cur.executemany("""
-                INSERT INTO business_categories (business_id, category)
-                VALUES (?, ?)
-            """, cat_batch)
-
-        if hours_batch:
-            cur.executemany("""
-                INSERT INTO business_hours (business_id, day, open_close)
-                VALUES (?, ?, ?)
-            """, hours_batch)
+    # byte offset of the last committed line per source, so an interrupted
+    # sequential load picks up where it stopped instead of starting over
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_progress (
+            source      TEXT PRIMARY KEY,
+            offset      INTEGER NOT NULL,
+            done        INTEGER DEFAULT 0
+        );
+    """)
 
-        con.commit()
     con.close()
-    print("Successfully populated the table business and related tables")
 
-def populate_review_table() -> None:
+def create_deferred_indexes() -> None:
     con: sqlite3.Connection = sqlite3.connect(DB_NAME, timeout=30)
-    cur: sqlite3.Cursor = con.cursor()
-    cur.execute("PRAGMA journal_mode=WAL;")
-    print("Starting to populate review table")
-    with open(REVIEW_JSON_PATH, "r", encoding="utf-8") as file:
-        review_batch = []
-
-        for line_num, line in enumerate(file, start=1):
-            data: Dict[str, Any] = json.loads(line)
-
-            review_batch.append((
-                data["review_id"],
-                data["user_id"],
-                data["business_id"],
-                float(data["stars"]),
-                data["date"],
-                data.get("text", ""),
-                int(data.get("useful", 0)),
-                int(data.get("funny", 0)),
-                int(data.get("cool", 0))
-            ))
-
-            if line_num % BATCH_SIZE == 0:
-                cur.executemany("""
-                    INSERT INTO review (
-                        review_id, user_id, business_id, stars, date, text, useful, funny, cool
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, review_batch)
-
-                con.commit()
-                review_batch = []
-
-        if review_batch:
-            cur.executemany("""
-                INSERT INTO review (
-                    review_id, user_id, business_id, stars, date, text, useful, funny, cool
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, review_batch)
-
-            con.commit()
-
+    for table, key in DEFERRED_KEYS.items():
+        start = time.perf_counter()
+        con.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_{key} ON {table} ({key});")
+        print(f"Indexed {table}.{key} in {time.perf_counter() - start:.1f}s")
+    con.commit()
     con.close()
-    print("Successfully populated the review table")
-
 
-
-def populate_tip_table() -> None:
-    con: sqlite3.Connection = sqlite3.connect(DB_NAME, timeout=30)
-    cur: sqlite3.Cursor = con.cursor()
-    cur.execute("PRAGMA journal_mode=WAL;")
-    print("Starting to populate tip table")
-    with open(TIP_JSON_PATH, "r", encoding="utf-8") as file:        
-        tip_batch = []
-
-        for line_num, line in enumerate(file, start=1):
+INSERT_SQL = {
+    "business": """
+        INSERT INTO business (
+            business_id, name, address, city, state, postal_code,
+            latitude, longitude, stars, review_count, is_open
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    "business_attributes": """
+        INSERT INTO business_attributes (business_id, attr_key, attr_value)
+        VALUES (?, ?, ?)
+    """,
+    "business_categories": """
+        INSERT INTO business_categories (business_id, category)
+        VALUES (?, ?)
+    """,
+    "business_hours": """
+        INSERT INTO business_hours (business_id, day, open_close)
+        VALUES (?, ?, ?)
+    """,
+    "review": """
+        INSERT INTO review (
+            review_id, user_id, business_id, stars, date, text, useful, funny, cool
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    "tip": """
+        INSERT INTO tip (tip_id, user_id, business_id, text, date, compliment_count)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+    "user": """
+        INSERT INTO user (
+            user_id, name, review_count, yelping_since, useful, funny, cool,
+            fans, average_stars, compliment_hot, compliment_more, compliment_profile,
+            compliment_cute, compliment_list, compliment_note, compliment_plain,
+            compliment_cool, compliment_funny, compliment_writer, compliment_photos
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+}
+
+# the parse_* functions turn one decoded JSON line into rows, appending them to
+# the batch of every table that line feeds (business.json feeds four tables).
+# `line` is the line's 1-based number in the dump, which tips (having no id of
+# their own) are keyed by, so a full, filtered, parallel or direct load all give a
+# tip the same tip_id; other sources ignore it.
+def parse_business(data: Dict[str, Any], batches: Dict[str, list], line: int) -> None:
+    batches["business"].append((
+        data["business_id"],
+        data["name"],
+        data["address"],
+        data["city"],
+        data["state"],
+        data["postal_code"],
+        data["latitude"],
+        data["longitude"],
+        data["stars"],
+        data["review_count"],
+        data["is_open"]
+    ))
+
+    if data.get("attributes"):
+        for k, v in data["attributes"].items():
+            batches["business_attributes"].append((data["business_id"], k, str(v)))
+
+    if data.get("categories"):
+        for cat in data["categories"].split(", "):
+            batches["business_categories"].append((data["business_id"], cat))
+
+    if data.get("hours"):
+        for day, hours in data["hours"].items():
+            batches["business_hours"].append((data["business_id"], day, hours))
+
+def parse_review(data: Dict[str, Any], batches: Dict[str, list], line: int) -> None:
+    batches["review"].append((
+        data["review_id"],
+        data["user_id"],
+        data["business_id"],
+        float(data["stars"]),
+        data["date"],
+        data.get("text", ""),
+        int(data.get("useful", 0)),
+        int(data.get("funny", 0)),
+        int(data.get("cool", 0))
+    ))
+
+def parse_tip(data: Dict[str, Any], batches: Dict[str, list], line: int) -> None:
+    batches["tip"].append((
+        line,
+        data["user_id"],
+        data["business_id"],
+        data.get("text", ""),
+        data["date"],
+        int(data.get("compliment_count", 0))
+    ))
+
+def parse_user(data: Dict[str, Any], batches: Dict[str, list], line: int) -> None:
+    batches["user"].append((
+        data["user_id"],
+        data.get("name", ""),
+        int(data.get("review_count", 0)),
+        data.get("yelping_since", ""),
+        int(data.get("useful", 0)),
+        int(data.get("funny", 0)),
+        int(data.get("cool", 0)),
+        int(data.get("fans", 0)),
+        float(data.get("average_stars", 0.0)),
+        int(data.get("compliment_hot", 0)),
+        int(data.get("compliment_more", 0)),
+        int(data.get("compliment_profile", 0)),
+        int(data.get("compliment_cute", 0)),
+        int(data.get("compliment_list", 0)),
+        int(data.get("compliment_note", 0)),
+        int(data.get("compliment_plain", 0)),
+        int(data.get("compliment_cool", 0)),
+        int(data.get("compliment_funny", 0)),
+        int(data.get("compliment_writer", 0)),
+        int(data.get("compliment_photos", 0))
+    ))
+
+# source -> (json file, line parser, tables it populates)
+SOURCES = {
+    "business": (BUSINESS_JSON_PATH, parse_business,
+                 ["business", "business_attributes", "business_categories", "business_hours"]),
+    "review": (REVIEW_JSON_PATH, parse_review, ["review"]),
+    "tip": (TIP_JSON_PATH, parse_tip, ["tip"]),
+    "user": (USER_JSON_PATH, parse_user, ["user"]),
+}
+
+# sources whose parser uses the line number, counted up to a resume offset or
+# shard start only for these (counting review.json's lines would cost a full read)
+LINE_KEYED = {"tip"}
+
+# field each source is matched on against the keep-set in --florida-gyms mode
+FILTER_KEYS = {
+    "business": "business_id",
+    "review": "business_id",
+    "tip": "business_id",
+    "user": "user_id",
+}
+
+def scan_business_ids(path: str = BUSINESS_JSON_PATH, state: str = FILTER_STATE,
+                      category: str = FILTER_CATEGORY) -> Set[str]:
+    keep = set()
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if category not in line: # cheap reject before decoding the line
+                continue
             data: Dict[str, Any] = json.loads(line)
+            if data["state"] == state and category in (data.get("categories") or "").split(", "):
+                keep.add(data["business_id"])
+    return keep
+
+# number of lines (newlines) before each byte offset of `offsets`, in one read
+def lines_before(path: str, offsets: List[int]) -> List[int]:
+    counts, lines, pos = [], 0, 0
+    with open(path, "rb") as file:
+        for offset in offsets:
+            while pos < offset and (chunk := file.read(min(LINE_CHUNK, offset - pos))):
+                pos += len(chunk)
+                lines += chunk.count(b"\n")
+            counts.append(lines)
+    return counts
+
+def new_batches(source: str) -> Dict[str, list]:
+    return {table: [] for table in SOURCES[source][2]}
+
+def insert_batches(cur: sqlite3.Cursor, batches: Dict[str, list]) -> None:
+    for table, rows in batches.items():
+        if rows:
+            cur.executemany(INSERT_SQL[table], rows)
+
+def batch_full(lines: int, size: int, batch_bytes: int | None) -> bool:
+    return size >= batch_bytes if batch_bytes else lines >= BATCH_SIZE
+
+def report_rate(table: str, rows: int, elapsed: float) -> None:
+    print(f"{table}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+def save_progress(cur: sqlite3.Cursor, source: str, offset: int, done: bool = False) -> None:
+    cur.execute(
+        "INSERT OR REPLACE INTO ingest_progress (source, offset, done) VALUES (?, ?, ?)",
+        (source, offset, int(done))
+    )
+
+def referenced_users(cur: sqlite3.Cursor) -> Set[str]:
+    return {row[0] for row in cur.execute("SELECT user_id FROM review UNION SELECT user_id FROM tip")}
+
+# keep: ids (matched on FILTER_KEYS[source]) to persist, None stores every line.
+# Each batch is committed together with the byte offset it ends at, so a rerun
+# after a crash resumes from the last committed batch.
+def populate_table(source: str, keep: Set[str] | None = None,
+                   profile: Dict[str, Any] = PROFILES["default"]) -> None:
+    path, parse, tables = SOURCES[source]
+    key = FILTER_KEYS[source]
+    con: sqlite3.Connection = connect(profile)
+    cur: sqlite3.Cursor = con.cursor()
 
-            tip_batch.append((
-                data["user_id"],
-                data["business_id"],
-                data.get("text", ""),
-                data["date"],
-                int(data.get("compliment_count", 0))
-            ))
-
-            if line_num % BATCH_SIZE == 0:
-                cur.executemany("""
-                    INSERT INTO tip (user_id, business_id, text, date, compliment_count)
-                    VALUES (?, ?, ?, ?, ?)
-                """, tip_batch)
-
+    offset, done = cur.execute(
+        "SELECT offset, done FROM ingest_progress WHERE source = ?", (source,)
+    ).fetchone() or (0, 0)
+    if done:
+        con.close()
+        print(f"The {source} table is already populated, skipping")
+        return
+    if offset:
+        print(f"Resuming the {source} table from byte {offset}")
+    line = lines_before(path, [offset])[0] if offset and source in LINE_KEYED else 0
+
+    print(f"Starting to populate {source} table")
+    start = time.perf_counter()
+    rows = dict.fromkeys(tables, 0)
+    with open(path, "rb") as file:
+        file.seek(offset)
+        batches = new_batches(source)
+
+        lines = size = 0
+
+        for raw in file:
+            offset += len(raw)
+            line += 1
+            data: Dict[str, Any] = json.loads(raw)
+            if keep is not None and data[key] not in keep:
+                continue
+            parse(data, batches, line)
+            lines += 1
+            size += len(raw)
+
+            if batch_full(lines, size, profile["batch_bytes"]):
+                insert_batches(cur, batches)
+                save_progress(cur, source, offset)
                 con.commit()
-                tip_batch = []
-
-        if tip_batch:
-            cur.executemany("""
-                INSERT INTO tip (user_id, business_id, text, date, compliment_count)
-                VALUES (?, ?, ?, ?, ?)
-            """, tip_batch)
+                for table, batch in batches.items():
+                    rows[table] += len(batch)
+                batches = new_batches(source)
+                lines = size = 0
 
-            con.commit()
+        insert_batches(cur, batches)
+        save_progress(cur, source, offset, done=True)
+        con.commit()
+        for table, batch in batches.items():
+            rows[table] += len(batch)
 
     con.close()
-    print("Successfully populated the tip table")
-
-def populate_user_table() -> None:
-    con: sqlite3.Connection = sqlite3.connect(DB_NAME, timeout=30)
+    elapsed = time.perf_counter() - start
+    for table in tables:
+        report_rate(table, rows[table], elapsed)
+    print(f"Successfully populated the {source} table")
+
+# Parallel ingestion: every JSON file is split into newline-aligned byte ranges
+# that a process pool parses concurrently. Parsed batches go through a bounded
+# queue to a single writer process, so SQLite only ever sees one connection
+# writing (several writers just serialize on the database lock). If the writer
+# dies, `writer_stopped` is set (by the writer itself, or by the parent once it
+# sees the process gone): parsers blocked on the full queue give up and the load
+# fails instead of hanging.
+
+_batch_queue = None
+_writer_stopped = None
+
+def _init_parser(queue, writer_stopped) -> None:
+    global _batch_queue, _writer_stopped
+    _batch_queue, _writer_stopped = queue, writer_stopped
+
+def put_batches(batches: Dict[str, list]) -> None:
+    while True:
+        if _writer_stopped.is_set():
+            # batches still buffered for the dead writer must not block this process' exit
+            _batch_queue.cancel_join_thread()
+            raise RuntimeError("SQLite writer stopped, abandoning shard")
+        try:
+            _batch_queue.put(batches, timeout=WRITER_POLL)
+            return
+        except Full:
+            continue
+
+def shard_file(path: str, shards: int) -> List[Tuple[int, int]]:
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as file:
+        for i in range(1, shards):
+            file.seek(max(size * i // shards, bounds[-1]))
+            file.readline()
+            bounds.append(min(file.tell(), size))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+# first_line: lines before `start` (see LINE_KEYED)
+def parse_shard(source: str, start: int, end: int, first_line: int, keep: Set[str] | None = None,
+                batch_bytes: int | None = None) -> Set[str]:
+    path, parse, _ = SOURCES[source]
+    key = FILTER_KEYS[source]
+    users = set()
+    lines = size = 0
+    batches = new_batches(source)
+    line = first_line
+    with open(path, "rb") as file:
+        file.seek(start)
+        pos = start
+        while pos < end:
+            raw = file.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            line += 1
+            data: Dict[str, Any] = json.loads(raw)
+            if keep is not None:
+                if data[key] not in keep:
+                    continue
+                if source in ("review", "tip"):
+                    users.add(data["user_id"])
+            parse(data, batches, line)
+            lines += 1
+            size += len(raw)
+
+            if batch_full(lines, size, batch_bytes):
+                put_batches(batches)
+                batches = new_batches(source)
+                lines = size = 0
+
+    put_batches(batches)
+    return users
+
+def write_batches(queue, writer_stopped, profile: Dict[str, Any] = PROFILES["default"]) -> None:
+    con: sqlite3.Connection = connect(profile)
     cur: sqlite3.Cursor = con.cursor()
-    cur.execute("PRAGMA journal_mode=WAL;")
-    print("Starting to populate user table")
-    with open(USER_JSON_PATH, "r") as file:
-        user_batch = []
-        elite_batch = []
-
-        for line_num, line in enumerate(file, start=1):
-            data: Dict[str, Any] = json.loads(line)
-
-            user_batch.append((
-                data["user_id"],
-                data.get("name", ""),
-                int(data.get("review_count", 0)),
-                data.get("yelping_since", ""),
-                int(data.get("useful", 0)),
-                int(data.get("funny", 0)),
-                int(data.get("cool", 0)),
-                int(data.get("fans", 0)),
-                float(data.get("average_stars", 0.0)),
-                int(data.get("compliment_hot", 0)),
-                int(data.get("compliment_more", 0)),
-                int(data.get("compliment_profile", 0)),
-                int(data.get("compliment_cute", 0)),
-                int(data.get("compliment_list", 0)),
-                int(data.get("compliment_note", 0)),
-                int(data.get("compliment_plain", 0)),
-                int(data.get("compliment_cool", 0)),
-                int(data.get("compliment_funny", 0)),
-                int(data.get("compliment_writer", 0)),
-                int(data.get("compliment_photos", 0))
-            ))
-
-            if line_num % BATCH_SIZE == 0:
-                cur.executemany("""
-                    INSERT INTO user (
-                        user_id, name, review_count, yelping_since, useful, funny, cool,
-                        fans, average_stars, compliment_hot, compliment_more, compliment_profile,
-                        compliment_cute, compliment_list, compliment_note, compliment_plain,
-                        compliment_cool, compliment_funny, compliment_writer, compliment_photos
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, user_batch)
-
-                con.commit()
-                user_batch = []
-
-        if user_batch:
-            cur.executemany("""
-                INSERT INTO user (
-                    user_id, name, review_count, yelping_since, useful, funny, cool,
-                    fans, average_stars, compliment_hot, compliment_more, compliment_profile,
-                    compliment_cute, compliment_list, compliment_note, compliment_plain,
-                    compliment_cool, compliment_funny, compliment_writer, compliment_photos
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, user_batch)
+    rows: Dict[str, int] = {}
+    started: Dict[str, float] = {}
+    finished: Dict[str, float] = {}
 
+    try:
+        while (batches := queue.get()) is not None:
+            for table in batches:
+                started.setdefault(table, time.perf_counter())
+            insert_batches(cur, batches)
             con.commit()
-
+            now = time.perf_counter()
+            for table, batch in batches.items():
+                rows[table] = rows.get(table, 0) + len(batch)
+                finished[table] = now
+    except BaseException:
+        writer_stopped.set()
+        raise
+    finally:
+        con.close()
+    for table, count in rows.items():
+        report_rate(table, count, finished[table] - started[table])
+
+# waits for the shards, failing as soon as the writer is gone
+def parse_shards(e: ProcessPoolExecutor, shards: List[Tuple[str, int, int, int]], writer: mp.Process,
+                 writer_stopped, keep: Set[str] | None = None, batch_bytes: int | None = None) -> Set[str]:
+    futures = [e.submit(parse_shard, *shard, keep, batch_bytes) for shard in shards]
+    pending = set(futures)
+    while pending:
+        _, pending = wait(pending, timeout=WRITER_POLL)
+        if pending and not writer.is_alive():
+            writer_stopped.set()
+            for future in pending:
+                future.cancel()
+            raise RuntimeError(f"SQLite writer exited with code {writer.exitcode}")
+    users = set()
+    for future in futures:
+        users |= future.result()
+    return users
+
+# rows already in the database, from an earlier or interrupted load
+def has_rows(con: sqlite3.Connection) -> bool:
+    return any(con.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() for table in INSERT_SQL)
+
+def populate_tables_parallel(workers: int | None = None, keep: Set[str] | None = None,
+                             profile: Dict[str, Any] = PROFILES["default"]) -> None:
+    workers = workers or os.cpu_count() or 1
+    # shards are not checkpointed, so a parallel load only runs on an empty
+    # database (pipeline.run_ingest deletes it first)
+    con: sqlite3.Connection = sqlite3.connect(DB_NAME, timeout=30)
+    done = {source for source, in con.execute("SELECT source FROM ingest_progress WHERE done = 1")}
+    populated = has_rows(con)
     con.close()
-    print("Successfully populated the user table")
-
-
-# def transform_json_to_sql() -> None:
-#     print("Creating database:")
-#     create_db()
-#     print("Database created successfully\nPopulating tables")
-#     with ProcessPoolExecutor() as e:
-#         futures = [
-#             e.submit(populate_business_table),
-#             e.submit(populate_review_table),
-#             e.submit(populate_tip_table),
-#             e.submit(populate_user_table)
-#         ]
-        
-#         dones, _ = wait(futures)
-
-#         for done in dones:
-#             try:
-#                 done.result()
-#             except FileNotFoundError:
-#                 print("Some file(s) from the Yelp Database was(were) not found")
-#                 print("Make sure to download and store them with the specified format")
-#                 print("./yelp_json/{here the json files}")
-#                 print("https://business.yelp.com/data/resources/open-dataset/")
-#                 sys.exit(1)
-
-def transform_json_to_sql() -> None:
+    if done == set(SOURCES):
+        print("All tables are already populated, skipping")
+        return
+    if populated:
+        raise RuntimeError(f"{DB_NAME} already holds rows from another load; delete it to reload in parallel, "
+                           "or run without --parallel to resume from its progress")
+
+    shards = {}
+    for source, (path, _, _) in SOURCES.items():
+        bounds = shard_file(path, workers)
+        first_lines = lines_before(path, [start for start, _ in bounds]) if source in LINE_KEYED else [0] * len(bounds)
+        shards[source] = [(source, start, end, first) for (start, end), first in zip(bounds, first_lines)]
+    print(f"Parsing {sum(map(len, shards.values()))} shards with {workers} workers")
+
+    queue = mp.Queue(maxsize=QUEUE_SIZE)
+    writer_stopped = mp.Event()
+    batch_bytes = profile["batch_bytes"]
+    writer = mp.Process(target=write_batches, args=(queue, writer_stopped, profile))
+    writer.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_parser,
+                                 initargs=(queue, writer_stopped)) as e:
+            if keep is None:
+                parse_shards(e, [shard for source in SOURCES for shard in shards[source]], writer, writer_stopped,
+                             None, batch_bytes)
+            else:
+                # users can only be filtered once every kept review/tip has been seen
+                users = parse_shards(e, shards["business"] + shards["review"] + shards["tip"], writer,
+                                     writer_stopped, keep, batch_bytes)
+                parse_shards(e, shards["user"], writer, writer_stopped, users, batch_bytes)
+    finally:
+        # a live writer drains the queue up to the sentinel; a dead one never will
+        while writer.is_alive():
+            try:
+                queue.put(None, timeout=WRITER_POLL)
+                break
+            except Full:
+                continue
+        else:
+            queue.cancel_join_thread()
+        writer.join()
+
+    if writer.exitcode != 0:
+        raise RuntimeError(f"SQLite writer exited with code {writer.exitcode}")
+
+    con = sqlite3.connect(DB_NAME, timeout=30)
+    for source, (path, _, _) in SOURCES.items():
+        save_progress(con.cursor(), source, os.path.getsize(path), done=True)
+    con.commit()
+    con.close()
+    print("Successfully populated all tables")
+
+def transform_json_to_sql(parallel: bool = False, workers: int | None = None,
+                          florida_gyms: bool = False, profile: str = "default") -> None:
+    settings = PROFILES[profile]
     print("Creating databases:")
-    create_db()
+    create_db(settings["defer_indexes"])
     print("Database created successfully\nPopulating tables")
     try:
-        populate_business_table()
-        populate_review_table()
-        populate_tip_table()
-        populate_user_table()
+        keep = None
+        if florida_gyms:
+            keep = scan_business_ids()
+            print(f"Keeping {len(keep)} businesses in {FILTER_STATE} categorized as {FILTER_CATEGORY}")
+
+        if parallel:
+            populate_tables_parallel(workers, keep, settings)
+        elif keep is None:
+            for source in SOURCES:
+                populate_table(source, profile=settings)
+        else:
+            populate_table("business", keep, settings)
+            populate_table("review", keep, settings)
+            populate_table("tip", keep, settings)
+            # only the kept reviews/tips are stored, so the database knows the
+            # users to keep, even when the review/tip load was resumed
+            con: sqlite3.Connection = sqlite3.connect(DB_NAME, timeout=30)
+            users = referenced_users(con.cursor())
+            con.close()
+            populate_table("user", users, settings)
     except FileNotFoundError:
         print("Some file(s) from the Yelp Database was(were) not found")
         print("Make sure to download and store them with the specified format")
@@ -401,8 +638,25 @@ def transform_json_to_sql() -> None:
         print("https://business.yelp.com/data/resources/open-dataset/")
         sys.exit(1)
 
-def main() -> int:
-    transform_json_to_sql()
+    if settings["defer_indexes"]:
+        create_deferred_indexes()
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load the Yelp JSON dumps into gyms.db")
+    parser.add_argument("--parallel", action="store_true",
+                        help="parse byte-range shards in a process pool and stream them to a single SQLite writer")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="parser processes for --parallel (defaults to the number of CPUs)")
+    parser.add_argument("--florida-gyms", action="store_true",
+                        help=f"only store {FILTER_CATEGORY} in {FILTER_STATE} and the reviews, tips and users that reference them")
+    parser.add_argument("--profile", choices=list(PROFILES), default="default",
+                        help="SQLite settings for the load; bulk is faster but not crash safe")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    transform_json_to_sql(parallel=args.parallel, workers=args.workers, florida_gyms=args.florida_gyms,
+                          profile=args.profile)
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+import folium
+import branca.colormap as cm
+from folium.plugins import FastMarkerCluster, HeatMap
+from folium.utilities import JsCode
+
+import spatial
+
+# The Overview maps: a static base (tiles, legend) plus one layer of gym points,
+# built without streamlit so benchmarks/bench_maps.py can import them. Points go
+# out as one GeoJSON FeatureCollection per layer, built column-wise: the browser
+# gets the points and their properties once, and a single on_each_feature
+# callback styles them, instead of one Marker object (and block of JavaScript)
+# per gym. The page swaps in only the points of the current viewport (see
+# spatial.py).
+
+MAP_CENTER = [27.9011955, -82.5318599]
+MAP_ZOOM = 9
+
+def star_colors(stars: pd.Series) -> np.ndarray:
+    return np.select(
+        [stars > 4, stars > 3, stars > 2, stars > 1],
+        ["green", "lightgreen", "orange", "red"],
+        default="purple"
+    )
+
+def point_features(df: pd.DataFrame, **properties) -> dict:
+    names = list(properties)
+    rows = zip(*(np.asarray(values).tolist() for values in properties.values()))
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": dict(zip(names, row))}
+            for lat, lon, row in zip(df["latitude"].tolist(), df["longitude"].tolist(), rows)
+        ]
+    }
+
+def review_colormap(agg):
+    review_counts = agg["business_points"]["review_count"]
+    colormap = cm.linear.YlOrRd_09.scale(review_counts.min(), review_counts.max())
+    colormap.caption = "Number of Reviews"
+    return colormap
+
+def base_map(key, agg):
+    m = folium.Map(location=MAP_CENTER, zoom_start=MAP_ZOOM, tiles="cartodb positron")
+    if key == "review_map":
+        review_colormap(agg).add_to(m)
+    return m
+
+def star_layer(df_b, agg):
+    layer = folium.FeatureGroup(name="Gyms")
+    folium.GeoJson(
+        point_features(df_b, name=df_b["name"], stars=df_b["stars"].astype(str), color=star_colors(df_b["stars"])),
+        marker=folium.Marker(icon=folium.Icon(prefix="fa", icon="dumbbell")),
+        on_each_feature=JsCode("""
+            function(feature, layer) {
+                var p = feature.properties;
+                layer.setIcon(L.AwesomeMarkers.icon(Object.assign({}, layer.options.icon.options, {markerColor: p.color})));
+                layer.bindTooltip(p.name);
+                layer.bindPopup("<b>" + p.name + "</b><br>Rating: " + p.stars + " ⭐<br>", {maxWidth: 300});
+            }
+        """)
+    ).add_to(layer)
+    return layer
+
+def cluster_layer(df_b, agg):
+    layer = folium.FeatureGroup(name="Gyms")
+    tooltips = (df_b["name"] + "<br>Stars: " + df_b["stars"].astype(str) + "<br>Reviews: "
+                + df_b["review_count"].astype(str) + "<br>Tips: " + df_b["tips"].astype(str))
+    FastMarkerCluster(
+        pd.DataFrame({
+            "latitude": df_b["latitude"],
+            "longitude": df_b["longitude"],
+            "radius": 5 + df_b["review_count"] / 50,
+            "color": star_colors(df_b["stars"]),
+            "tooltip": tooltips,
+        }).values.tolist(),
+        callback="""
+            function(row) {
+                var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+                    {radius: row[2], color: row[3], fill: true, fillOpacity: 0.7});
+                marker.bindTooltip(row[4]);
+                return marker;
+            }
+        """
+    ).add_to(layer)
+    return layer
+
+def heat_layer(df_b, agg):
+    layer = folium.FeatureGroup(name="Gyms")
+    HeatMap(df_b[["latitude", "longitude"]].values.tolist()).add_to(layer)
+    return layer
+
+def review_layer(df_b, agg):
+    layer = folium.FeatureGroup(name="Gyms")
+    colormap = review_colormap(agg)
+    colors = df_b["review_count"].map({count: colormap(count) for count in df_b["review_count"].unique()})
+    folium.GeoJson(
+        point_features(df_b, name=df_b["name"], review_count=df_b["review_count"], color=colors,
+                       radius=np.maximum(3, df_b["review_count"] ** 0.7)),
+        marker=folium.CircleMarker(fill=True, fill_opacity=0.6),
+        on_each_feature=JsCode("""
+            function(feature, layer) {
+                var p = feature.properties;
+                layer.setStyle({color: p.color, fillColor: p.color});
+                layer.setRadius(p.radius);
+                layer.bindTooltip(p.name);
+                layer.bindPopup("<b>" + p.name + "</b><br>Reviews: " + p.review_count + "<br>", {maxWidth: 300});
+            }
+        """)
+    ).add_to(layer)
+    return layer
+
+# grid cells sent instead of points when a viewport is too dense: the heatmap is
+# weighted by the gyms per cell, the other maps get one bubble per cell
+def cells_layer(key, cells):
+    layer = folium.FeatureGroup(name="Gym clusters")
+    if key == "heat_map":
+        HeatMap(cells[["latitude", "longitude", "count"]].values.tolist()).add_to(layer)
+        return layer
+    folium.GeoJson(
+        point_features(cells, count=cells["count"], stars=cells["stars"].round(2),
+                       radius=6 + 4 * np.log2(cells["count"])),
+        marker=folium.CircleMarker(color="#3388ff", fill=True, fill_opacity=0.5),
+        on_each_feature=JsCode("""
+            function(feature, layer) {
+                var p = feature.properties;
+                layer.setRadius(p.radius);
+                layer.bindTooltip(p.count + " gyms<br>Avg stars: " + p.stars);
+            }
+        """)
+    ).add_to(layer)
+    return layer
+
+def map_layer(key, agg, index, bounds, zoom):
+    kind, rows = spatial.query_viewport(index, bounds, zoom)
+    return OVERVIEW_MAPS[key](rows, agg) if kind == "points" else cells_layer(key, rows)
+
+# the whole map with every point, as it was before viewport serving
+def build_map(key, agg):
+    m = base_map(key, agg)
+    OVERVIEW_MAPS[key](agg["business_points"], agg).add_to(m)
+    return m
+
+# map key -> layer builder taking the points to draw, in Overview page order
+OVERVIEW_MAPS = {
+    "star_map": star_layer,
+    "cluster_map": cluster_layer,
+    "heat_map": heat_layer,
+    "review_map": review_layer,
+}
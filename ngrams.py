@@ -0,0 +1,142 @@
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Tuple
+
+import polars as pl
+from sklearn.feature_extraction import text as sklearn_text
+
+# Single-pass n-gram counts for the review word clouds (nlp.py), replacing one
+# CountVectorizer fit per bucket and n-gram size. Documents arrive as polars
+# batches of (bucket, text), e.g. bad/good reviews. Each batch is tokenized once,
+# the way CountVectorizer does: lowercase \w\w+ tokens, with stop words dropped
+# before n-grams are formed. Its uni-, bi- and trigrams for every bucket are then
+# counted in one group_by: total occurrences (tf) and the number of documents
+# containing each n-gram (df). min_df/max_df are applied at the end exactly as a
+# CountVectorizer fit on that bucket would apply them, without building any
+# document-term matrix.
+# Tokens get integer ids from a vocabulary kept across batches, and an n-gram is
+# its ids (plus one) packed into one uint64, so grouping hashes integers rather
+# than strings and the key alone tells the n-gram size; only the final top-k
+# n-grams are turned back into text.
+# Memory is bounded by lossy counting. Once the merged table holds more than
+# MAX_TERMS rows, the n-grams seen in the fewest documents so far are dropped,
+# with a floor that rises each time. An n-gram that comes back restarts from
+# zero, so only n-grams rarer than the floor, far below any top-k, can be
+# undercounted.
+
+TOKEN_PATTERN = r"\b\w\w+\b" # CountVectorizer's default token_pattern
+NGRAM_SIZES = (1, 2, 3)
+ID_BITS = 21 # bits per token id in a packed n-gram (3 x 21 <= 64)
+MAX_TERMS = 2_000_000 # (bucket, n-gram) rows kept before pruning
+BATCH_ROWS = 10_000 # documents per batch; bounds the exploded token and n-gram frames
+GROUP = ["bucket", "key"]
+
+def stop_words(extra: Iterable[str] = ()) -> frozenset:
+    return frozenset(sklearn_text.ENGLISH_STOP_WORDS.union(extra))
+
+def new_counts() -> Dict[str, Any]:
+    return {
+        "docs": Counter(), # documents per bucket
+        "buckets": [], # bucket code -> bucket
+        "vocab": pl.Series("token", [], pl.String), # token id -> token
+        "grams": pl.DataFrame(schema={"bucket": pl.UInt8, "key": pl.UInt64, "tf": pl.UInt32, "df": pl.UInt32}),
+        "pending": [], # per-batch tables not merged into grams yet
+        "floor": 0, # df at or below which n-grams were pruned
+    }
+
+# tokens of the batch -> their vocabulary ids, adding the tokens not seen before
+def token_ids(counts: Dict[str, Any], tokens: pl.Series) -> pl.Series:
+    vocab, unique = counts["vocab"], tokens.unique()
+    new = unique.filter(~unique.is_in(vocab.implode()))
+    if len(vocab) + len(new) >= 1 << ID_BITS:
+        raise ValueError(f"more than {1 << ID_BITS} distinct tokens; raise ngrams.ID_BITS or lower NGRAM_SIZES")
+    counts["vocab"] = vocab = pl.concat([vocab, new.sort()])
+    return tokens.replace_strict(vocab, pl.int_range(len(vocab), dtype=pl.UInt64, eager=True), return_dtype=pl.UInt64)
+
+def merge(counts: Dict[str, Any], max_terms: int = MAX_TERMS) -> None:
+    if not counts["pending"]:
+        return
+    grams = (pl.concat([counts["grams"], *counts["pending"]])
+             .group_by(GROUP).agg(pl.col("tf").sum(), pl.col("df").sum()))
+    counts["pending"] = []
+    while grams.height > max_terms:
+        counts["floor"] += 1
+        grams = grams.filter(pl.col("df") > counts["floor"])
+    counts["grams"] = grams
+
+def count_batch(counts: Dict[str, Any], batch: pl.DataFrame, stop: pl.Series,
+                sizes: Tuple[int, ...] = NGRAM_SIZES, max_terms: int = MAX_TERMS) -> None:
+    counts["docs"].update(dict(batch["bucket"].value_counts().iter_rows()))
+    buckets = counts["buckets"]
+    buckets.extend(sorted(set(batch["bucket"].unique()) - set(buckets)))
+    # buckets as uint8 codes and tokens as ids from here on, so the exploded
+    # frames carry no strings
+    tokens = (batch.with_row_index("doc")
+              .select("doc",
+                      pl.col("bucket").replace_strict(buckets, range(len(buckets)), return_dtype=pl.UInt8),
+                      pl.col("text").str.to_lowercase().str.extract_all(TOKEN_PATTERN).alias("token"))
+              .explode("token")
+              .drop_nulls("token")
+              .filter(~pl.col("token").is_in(stop.implode())))
+    tokens = tokens.select("doc", "bucket", id=token_ids(counts, tokens["token"]) + 1)
+
+    # n consecutive tokens of one document, packed first token highest
+    grams = pl.concat([
+        tokens.select(
+            "doc", "bucket",
+            pl.when(pl.all_horizontal([pl.col("doc").shift(-i) == pl.col("doc") for i in range(n)]))
+              .then(pl.sum_horizontal([pl.col("id").shift(-i) * pl.lit(1 << (ID_BITS * (n - 1 - i)), pl.UInt64)
+                                       for i in range(n)]))
+              .alias("key"),
+        ).drop_nulls("key")
+        for n in sizes
+    ])
+    # df counts the first occurrence of each n-gram in a document
+    counts["pending"].append(
+        grams.with_columns(first=pl.struct("doc", "key").is_first_distinct())
+             .group_by(GROUP)
+             .agg(pl.len().cast(pl.UInt32).alias("tf"), pl.col("first").sum().cast(pl.UInt32).alias("df")))
+    if sum(table.height for table in counts["pending"]) > max_terms:
+        merge(counts, max_terms)
+
+# batches of (bucket, text) -> counts to read with top_ngrams
+def count_ngrams(batches: Iterable[pl.DataFrame], stop: frozenset, sizes: Tuple[int, ...] = NGRAM_SIZES,
+                 max_terms: int = MAX_TERMS) -> Dict[str, Any]:
+    counts, stop = new_counts(), pl.Series(sorted(stop), dtype=pl.String)
+    for batch in batches:
+        count_batch(counts, batch, stop, sizes, max_terms)
+    merge(counts, max_terms)
+    return counts
+
+def decode(counts: Dict[str, Any], keys: pl.Series, n: int) -> List[str]:
+    vocab = counts["vocab"]
+    words = [vocab.gather(keys // (1 << (ID_BITS * (n - 1 - i))) % (1 << ID_BITS) - 1) for i in range(n)]
+    return pl.select(pl.concat_str(words, separator=" ")).to_series().to_list()
+
+# the `top_k` most frequent n-grams of size `n` in `bucket` kept by min_df/max_df
+# (document counts if int, fractions of the bucket's documents if float), ties
+# in alphabetical order like the CountVectorizer version
+def top_ngrams(counts: Dict[str, Any], bucket: str, n: int, top_k: int = 30, min_df: int | float = 5,
+               max_df: int | float = 0.9) -> List[Tuple[str, int]]:
+    n_docs = counts["docs"][bucket]
+    if not n_docs or bucket not in counts["buckets"]:
+        return []
+    if isinstance(min_df, int) and min_df > n_docs:
+        min_df = 1
+    low = min_df if isinstance(min_df, int) else min_df * n_docs
+    high = max_df if isinstance(max_df, int) else max_df * n_docs
+    if high < low:
+        print(f"[Aviso] max_df ({max_df}) deja menos documentos que min_df ({min_df})")
+        return []
+    merge(counts)
+    # n-gram keys of size n are in [2^(ID_BITS (n-1)), 2^(ID_BITS n))
+    kept = counts["grams"].filter(pl.col("bucket") == counts["buckets"].index(bucket),
+                                  pl.col("key") >= 1 << (ID_BITS * (n - 1)), pl.col("key") < 1 << (ID_BITS * n),
+                                  pl.col("df") >= low, pl.col("df") <= high)
+    if kept.is_empty():
+        return []
+    # every n-gram tied with the k-th, so ties can be broken on the text
+    cutoff = kept["tf"].top_k(min(top_k, kept.height)).min()
+    kept = kept.filter(pl.col("tf") >= cutoff)
+    pairs = list(zip(decode(counts, kept["key"], n), kept["tf"].to_list()))
+    pairs.sort(key=lambda pair: (-pair[1], pair[0]))
+    return pairs[:top_k]
@@ -1,15 +1,17 @@
 import polars as pl
 import re
-from sklearn.feature_extraction.text import CountVectorizer
 import matplotlib.pyplot as plt
 from collections import Counter
-from pathlib import Path
 from wordcloud import WordCloud
 
-lf_business = pl.scan_parquet("./data/business.parquet")
-lf_review   = pl.scan_parquet("./data/review.parquet")
-lf_tip      = pl.scan_parquet("./data/tip.parquet")
-lf_user     = pl.scan_parquet("./data/user.parquet")
+import columnar
+import ngrams
+import cleantext
+
+lf_business = columnar.scan("business")
+lf_review   = columnar.scan("review")
+lf_tip      = columnar.scan("tip")
+lf_user     = columnar.scan("user")
 
 OUTPUT_DIR = "./data/outputs_nlp"
 
@@ -19,98 +21,21 @@ CUSTOM_STOPWORDS = {
     "theyre", "weve", "yelp", "gym", "class", "classes"
 }
 
-_clean_url = re.compile(r"http\S+|www\.\S+")
-_clean_non_letters = re.compile(r"[^a-zA-Z\s']")
-_clean_multi_space = re.compile(r"\s+")
-def normalize_text(s: str) -> str:
-    if not isinstance(s, str):
-        return ""
-    s = s.lower()
-    s = _clean_url.sub(" ", s)
-    s = _clean_non_letters.sub(" ", s)
-    s = _clean_multi_space.sub(" ", s).strip()
-    return s
-
-
-reviews_min = (
-    lf_review
-      .select(["stars", "text"])
-      .drop_nulls()
-)
-
-bad_texts = (
-    reviews_min
-      .filter(pl.col("stars").is_in([1, 2]))
-      .select(pl.col("text").cast(pl.Utf8))
-      .collect()
-      .get_column("text")
-      .to_list()
-)
-
-good_texts = (
-    reviews_min
-      .filter(pl.col("stars").is_in([4, 5]))
-      .select(pl.col("text").cast(pl.Utf8))
-      .collect()
-      .get_column("text")
-      .to_list()
-)
-
-len_bad, len_good = len(bad_texts), len(good_texts)
-print(f"Total reseñas malas: {len_bad} | Total reseñas buenas: {len_good}")
-
+# stars -> word cloud bucket; 3-star reviews go to neither
+SENTIMENT = {1: "bad", 2: "bad", 4: "good", 5: "good"}
+read_counts = Counter()
 
-bad_texts_clean  = [normalize_text(t) for t in bad_texts if isinstance(t, str)]
-good_texts_clean = [normalize_text(t) for t in good_texts if isinstance(t, str)]
-
-bad_texts_clean  = [t for t in bad_texts_clean  if t]
-good_texts_clean = [t for t in good_texts_clean if t]
-
-print(f"Tras limpieza -> malas: {len(bad_texts_clean)} | buenas: {len(good_texts_clean)}")
-
-
-from sklearn.feature_extraction import text as sklearn_text
-from sklearn.feature_extraction.text import CountVectorizer
-import numpy as np
-
-def top_ngrams(
-    texts,
-    ngram_range=(1,1),
-    top_k=30,
-    min_df=5,
-    max_df=0.9,
-    extra_stopwords=None
-):
-    if not texts:
-        return []
-    if extra_stopwords is None:
-        extra_stopwords = set()
-    stop_words = list(sklearn_text.ENGLISH_STOP_WORDS.union(CUSTOM_STOPWORDS).union(extra_stopwords))
-
-    n_docs = len(texts)
-    safe_min_df = min_df
-    if isinstance(min_df, int) and min_df > n_docs:
-        safe_min_df = 1
-
-    vect = CountVectorizer(
-        ngram_range=ngram_range,
-        stop_words=stop_words,
-        min_df=safe_min_df,
-        max_df=max_df
-    )
-    try:
-        X = vect.fit_transform(texts)
-    except ValueError as e:
-        print(f"[Aviso] Vocabulario vacío: {e}")
-        return []
-    if X.shape[1] == 0:
-        return []
-
-    freqs = X.sum(axis=0).A1
-    vocab = vect.get_feature_names_out()
-    pairs = list(zip(vocab, freqs))
-    pairs.sort(key=lambda x: x[1], reverse=True)
-    return pairs[:top_k]
+# one pass over the cleaned reviews (cleantext.py): batches of (bucket, cleaned
+# text) of the non-empty reviews
+def sentiment_batches():
+    for batch in cleantext.batches(["stars", "text_clean"], ngrams.BATCH_ROWS):
+        reviews = (pl.from_arrow(batch)
+                     .drop_nulls()
+                     .filter(pl.col("stars").is_in(list(SENTIMENT)))
+                     .select(pl.col("stars").replace_strict(SENTIMENT, return_dtype=pl.String).alias("bucket"),
+                             pl.col("text_clean").alias("text")))
+        read_counts.update(dict(reviews["bucket"].value_counts().iter_rows()))
+        yield reviews.filter(pl.col("text") != "")
 
 
 TOP_K   = 30
@@ -118,17 +43,21 @@ MIN_DF  = 5
 MAX_DF  = 0.9
 EXTRA_SW = set()
 
-bad_uni = top_ngrams(bad_texts_clean,  (1,1), top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF, extra_stopwords=EXTRA_SW)
-bad_bi  = top_ngrams(bad_texts_clean,  (2,2), top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF, extra_stopwords=EXTRA_SW)
-bad_tri = top_ngrams(bad_texts_clean,  (3,3), top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF, extra_stopwords=EXTRA_SW)
+counts = ngrams.count_ngrams(sentiment_batches(), ngrams.stop_words(CUSTOM_STOPWORDS | EXTRA_SW))
 
-good_uni = top_ngrams(good_texts_clean, (1,1), top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF, extra_stopwords=EXTRA_SW)
-good_bi  = top_ngrams(good_texts_clean, (2,2), top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF, extra_stopwords=EXTRA_SW)
-good_tri = top_ngrams(good_texts_clean, (3,3), top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF, extra_stopwords=EXTRA_SW)
+len_bad, len_good = read_counts["bad"], read_counts["good"]
+print(f"Total reseñas malas: {len_bad} | Total reseñas buenas: {len_good}")
+print(f"Tras limpieza -> malas: {counts['docs']['bad']} | buenas: {counts['docs']['good']}")
 
+bad_uni = ngrams.top_ngrams(counts, "bad", 1, top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF)
+bad_bi  = ngrams.top_ngrams(counts, "bad", 2, top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF)
+bad_tri = ngrams.top_ngrams(counts, "bad", 3, top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF)
+
+good_uni = ngrams.top_ngrams(counts, "good", 1, top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF)
+good_bi  = ngrams.top_ngrams(counts, "good", 2, top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF)
+good_tri = ngrams.top_ngrams(counts, "good", 3, top_k=TOP_K, min_df=MIN_DF, max_df=MAX_DF)
 
 
-import re
 
 NOISE_UNI = {
     "great","good","best","love","really","just","like",
@@ -183,11 +112,6 @@ good_tri_f = filter_pairs(good_tri, 3)
 
 
 
-from wordcloud import WordCloud
-
-import matplotlib.pyplot as plt
-from pathlib import Path
-
 WC_DIR = OUTPUT_DIR
 
 
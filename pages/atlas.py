@@ -1,12 +1,26 @@
+from time import perf_counter
+
 import streamlit as st
 from embedding_atlas.streamlit import embedding_atlas
-from embedding_atlas.projection import compute_text_projection
 import pandas as pd
-import os
-from sentence_transformers import SentenceTransformer
 
-os.environ["CUDA_VISIBLE_DEVICES"] = ""
-#model = SentenceTransformer("all-MiniLM-L6-v2", device="cpu")
+import ann
+import embeddings
+from pages import registry
+
+# The embeddings, 2D projection and neighbors come from embeddings.py (computed
+# offline, built here only if missing); the page just joins them to the texts.
+@st.cache_resource(show_spinner="Loading embeddings...")
+def load_projection(table: str, version: str) -> pd.DataFrame:
+    return registry.register(f"{table} projection", version, embeddings.load_projection(table))
+
+@st.cache_resource(show_spinner="Loading the similarity index...")
+def load_ann_index(table: str, version: str):
+    return registry.register(f"{table} similarity index", version, ann.load_index(table))
+
+@st.cache_resource(show_spinner="Loading the embedding model...")
+def load_encoder():
+    return embeddings.load_encoder()
 
 if "value" not in st.session_state:
     st.session_state.value = "review"
@@ -18,9 +32,6 @@ def tips_atlas():
     st.session_state.value = "tip"
 
 def show_embedding(df):
-    compute_text_projection(
-        df, text="text", x="embedding_x", y="embedding_y", neighbors="neighbors", model="all-MiniLM-L6-v2", trust_remote_code=True
-    )
     return embedding_atlas(
         df,
         text="text",
@@ -31,6 +42,31 @@ def show_embedding(df):
         show_embedding=True,
     )
 
+# top-k texts of `table` closest to a free-text query, with their gym
+def similar_panel(table: str, df: pd.DataFrame, version: str):
+    label = "reviews" if table == "review" else "tips"
+    with st.expander(f"Find similar {label}"):
+        query = st.text_input("Text", key=f"similar_{table}",
+                              placeholder="e.g. the showers were dirty and nobody at the front desk cared")
+        k = st.slider("Results", 5, 50, 10, key=f"similar_k_{table}")
+        if not query:
+            return
+        start = perf_counter()
+        vector = load_encoder().encode([query])
+        encoded = perf_counter()
+        rows, scores = ann.similar(load_ann_index(table, version), vector, k)
+        searched = perf_counter()
+
+        found = rows[0] >= 0
+        columns = ["text", "stars", "date", "business_id"] if table == "review" else ["text", "date", "business_id"]
+        results = df.iloc[rows[0][found]][columns].assign(similarity=scores[0][found].round(3))
+        gyms = registry.frame("business", ["business_id", "name", "stars"]).set_index("business_id")
+        results.insert(0, "gym", results["business_id"].map(gyms["name"]))
+        results.insert(1, "gym stars", results["business_id"].map(gyms["stars"]))
+        st.caption(f"Query embedded in {(encoded - start) * 1000:.0f} ms, "
+                   f"searched in {(searched - encoded) * 1000:.1f} ms")
+        st.dataframe(results.drop(columns="business_id"), hide_index=True)
+
 st.set_page_config(layout="wide")
 
 col1, col2 = st.columns([1, 1])
@@ -39,10 +75,13 @@ with col1:
 with col2:
     st.button("Tips", on_click=tips_atlas, use_container_width=True)
 
-df_r = pd.read_parquet("./data/review.parquet")
-df_t = pd.read_parquet("./data/tip.parquet")
-
-if st.session_state.value == "review":
-    show_embedding(df_r)
-elif st.session_state.value == "tip":
-    show_embedding(df_t)
+# the shared table is read-only; the projection columns go on a shallow copy
+if st.session_state.value in ("review", "tip"):
+    table = st.session_state.value
+    df = registry.frame(table).copy(deep=False)
+    version = embeddings.source_version(table)
+    similar_panel(table, df, version)
+    projection = load_projection(table, version)
+    for column in ("embedding_x", "embedding_y", "neighbors"):
+        df[column] = projection[column].to_numpy()
+    show_embedding(df)
@@ -1,16 +1,12 @@
 import streamlit as st
-import pandas as pd
-from pages.graphs import build_franchise_graphs, load_datasets, render_features_grid
+import franchises
+from pages.graphs import build_franchise_graphs, load_franchise_index, render_features_grid
 
 st.set_page_config(layout="wide")
 st.title("🏋️ Florida Gyms Franchise Analysis")
 
-df_b, _, _ = load_datasets()
-
-franchise_counts = df_b["name"].value_counts()
-franchises = franchise_counts[franchise_counts >= 3].index.tolist()
-
-selected_gym = st.selectbox("Choose a franchise", franchises)
+index = load_franchise_index(franchises.dataset_version())
+selected_gym = st.selectbox("Choose a franchise", franchises.franchise_names(index, franchises.MIN_LOCATIONS))
 
 graphs = build_franchise_graphs(selected_gym)
 
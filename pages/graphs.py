@@ -1,119 +1,73 @@
+import os
+import shutil
+import hashlib
+import inspect
+import threading
 import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import geopandas as gpd
-import folium
-import branca.colormap as cm
-from folium.plugins import MarkerCluster, HeatMap
-import ast
-from collections import Counter
+import plotly.io as pio
 import streamlit as st
-import networkx as nx
-from math import radians, sin, cos, sqrt, atan2
 
+import aggregates
+import columnar
+import franchises
+import spatial
+from maps import OVERVIEW_MAPS, build_map
+from pages import registry
 
-@st.cache_data
-def load_datasets():
-    df_b = pd.read_parquet("./data/business.parquet")
-    db_r = pd.read_parquet("./data/review.parquet")
-    db_u = pd.read_parquet("./data/tip.parquet")
+# Everything below is loaded once per server process and shared by every session
+# (see pages/registry.py); the pages only read it.
 
-    return df_b, db_r, db_u
+# the page only takes read-only slices of it
+@st.cache_resource(show_spinner=False)
+def load_franchise_index(version: str):
+    return registry.register("franchise index", version, franchises.load_index(version))
 
 
-def build_graphs():
-    def style_plotly(fig, bgcolor="#262730", font_color="white"):
-        fig.update_layout(
-            plot_bgcolor=bgcolor,
-            paper_bgcolor=bgcolor,
-            font_color=font_color,
-            title_font_color=font_color,
-            legend_font_color=font_color,
-            xaxis=dict(
-                color=font_color,
-                gridcolor="#444444"  # optional, dark grid lines
-            ),
-            yaxis=dict(
-                color=font_color,
-                gridcolor="#444444"
-            )
-        )
-        return fig
+@st.cache_resource(show_spinner=False)
+def _load_features(version: str):
+    features = columnar.read("business_features").set_index("business_id")
+    return registry.register("business_features (by business_id)", version, features)
+
+
+def load_features():
+    return _load_features(registry.file_version("business_features"))
+
 
-    df_b, db_r, db_u = load_datasets()
+# keyed by the dataset version, so a rebuilt dataset is picked up without restarting the app
+@st.cache_resource(show_spinner=False)
+def load_aggregates(version: str):
+    return registry.register("aggregates", version, aggregates.load_store(version))
 
-    df = gpd.GeoDataFrame(
-        df_b,
-        geometry=gpd.points_from_xy(df_b.longitude, df_b.latitude)
+
+CHART_HEIGHT = 520
+FIGURE_DIR = "./data/figures"
+
+
+def style_plotly(fig, bgcolor="#262730", font_color="white"):
+    fig.update_layout(
+        plot_bgcolor=bgcolor,
+        paper_bgcolor=bgcolor,
+        font_color=font_color,
+        title_font_color=font_color,
+        legend_font_color=font_color,
+        xaxis=dict(
+            color=font_color,
+            gridcolor="#444444"  # optional, dark grid lines
+        ),
+        yaxis=dict(
+            color=font_color,
+            gridcolor="#444444"
+        )
     )
+    return fig
 
-    def get_color(stars) -> str:
-        if stars > 4: return "green"
-        elif stars > 3: return "lightgreen"
-        elif stars > 2: return "orange"
-        elif stars > 1: return "red"
-        return "purple"
-
-    graphs = []
-
-
-    m1 = folium.Map(location=[27.9011955, -82.5318599], zoom_start=9, tiles="cartodb positron")
-    for idx, row in df_b.iterrows():
-        folium.Marker(
-            location=[row["latitude"], row["longitude"]],
-            tooltip=row["name"],
-            popup=folium.Popup(
-                f"<b>{row['name']}</b><br>"
-                f"Rating: {row['stars']} ⭐<br>",
-                max_width=300
-            ),
-            icon=folium.Icon(color=get_color(row["stars"]), prefix="fa", icon="dumbbell")
-        ).add_to(m1)
-    graphs.append(m1)
-
-    m2 = folium.Map(location=[27.9011955, -82.5318599], zoom_start=9, tiles="cartodb positron")
-    tips_count = db_u.groupby("business_id").size().to_dict()
-    marker_cluster = MarkerCluster().add_to(m2)
-    for idx, row in df_b.iterrows():
-        folium.CircleMarker(
-            location=[row["latitude"], row["longitude"]],
-            radius=5 + row["review_count"]/50,
-            color=get_color(row["stars"]),
-            fill=True,
-            fill_opacity=0.7,
-            tooltip=f"{row['name']}<br>Stars: {row['stars']}<br>Reviews: {row['review_count']}<br>Tips: {tips_count.get(row['business_id'], 0)}"
-        ).add_to(marker_cluster)
-    graphs.append(m2)
-
-    m3 = folium.Map(location=[27.9011955, -82.5318599], zoom_start=9, tiles="cartodb positron")
-    data = df[["latitude", "longitude"]].values.tolist()
-    HeatMap(data).add_to(m3)
-    graphs.append(m3)
-
-    m4 = folium.Map(location=[27.9011955, -82.5318599], zoom_start=9, tiles="cartodb positron")
-    colormap = cm.linear.YlOrRd_09.scale(df_b["review_count"].min(), df_b["review_count"].max())
-    colormap.caption = "Number of Reviews"
-    for _, row in df_b.iterrows():
-        folium.CircleMarker(
-            location=[row["latitude"], row["longitude"]],
-            radius=max(3, row["review_count"] ** 0.7),
-            color=colormap(row["review_count"]),
-            fill=True,
-            fill_color=colormap(row["review_count"]),
-            fill_opacity=0.6,
-            tooltip=row["name"],
-            popup=folium.Popup(
-                f"<b>{row['name']}</b><br>"
-                f"Reviews: {row['review_count']}<br>",
-                max_width=300
-            )
-        ).add_to(m4)
-    colormap.add_to(m4)
-    graphs.append(m4)
 
+def build_review_count_box(agg):
     fig = px.box(
-        df_b,
+        agg["business_points"],
         x="stars",
         y="review_count",
         points=None,
@@ -124,31 +78,23 @@ def build_graphs():
         color_discrete_sequence=px.colors.qualitative.Prism
     )
     fig.update_layout(showlegend=False)
-    graphs.append(fig)
+    return fig
+
 
+def build_rating_histogram(agg):
     fig = px.histogram(
-        df_b,
+        agg["business_points"],
         x="stars",
         nbins=10,
         labels={"stars": "Stars"},
         title="Distribution of Gym Ratings"
     )
     fig.update_traces(marker=dict(color="darkblue", line=dict(width=1, color="lightblue")))
-    graphs.append(fig)
-
-    # Scatter
-    franchise_summary = df_b.groupby("name", as_index=False).agg(
-        avg_stars=("stars", "mean"),
-        num_locations=("business_id", "count"),
-        total_reviews=("review_count", "sum")
-    )
-
-    bins = [0, 3, 6, 10, 20, 50]
-    labels = ["1-3", "4-6", "7-10", "11-20", "21+"]
+    return fig
 
-    franchise_summary["location_group"] = pd.cut(franchise_summary["num_locations"], bins=bins, labels=labels, right=True)
 
-    top_franchises = franchise_summary.sort_values(by="num_locations", ascending=False).head(15)
+def build_top_franchises(agg):
+    top_franchises = agg["top_franchises"]
 
     color_scale = [
         [0.0, "red"],
@@ -156,7 +102,7 @@ def build_graphs():
         [1.0, "green"]
     ]
 
-    fig = px.bar(
+    return px.bar(
         top_franchises,
         x="num_locations",
         y="name",
@@ -168,11 +114,8 @@ def build_graphs():
     )
 
 
-    graphs.append(fig)
-
-
-    features_expanded = df_b["features"].dropna().apply(pd.Series)
-    feature_counts = features_expanded.sum().sort_values(ascending=True)
+def build_feature_counts(agg):
+    feature_counts = agg["feature_counts"].set_index("feature")["count"].rename_axis(None)
     fig = px.bar(
         feature_counts,
         x=feature_counts.values,
@@ -184,48 +127,23 @@ def build_graphs():
         color_continuous_scale="viridis"
     )
     fig.update_layout(showlegend=False)
-    graphs.append(fig)
-
-    working_expanded = (
-        df_b["working_days"]
-        .dropna()
-        .apply(pd.Series)
-        .melt(var_name="Day", value_name="Hours")
-        .dropna()
-    )
-    working_expanded[["Open", "Close"]] = working_expanded["Hours"].apply(
-        lambda x: pd.Series([x[0].hour, x[1].hour])
-    )
-    avg_hours = working_expanded.groupby("Day")[["Open", "Close"]].mean().reset_index()
-    fig = px.imshow(
-        avg_hours.set_index("Day"),
+    return fig
+
+
+def build_avg_hours(agg):
+    return px.imshow(
+        agg["avg_hours"].set_index("Day"),
         text_auto=".1f",
         aspect="auto",
         color_continuous_scale=px.colors.qualitative.Prism,
         labels=dict(color="Hour of Day"),
         title="Average Working Hours by Day"
     )
-    graphs.append(fig)
-
-    working_expanded = (
-        df_b[["business_id", "stars", "working_days"]]
-        .dropna(subset=["working_days"])
-        .set_index("business_id")["working_days"]
-        .apply(pd.Series)
-        .melt(ignore_index=False, var_name="Day", value_name="Hours")
-        .dropna()
-        .reset_index()
-    )
-    working_expanded["Duration"] = working_expanded["Hours"].apply(
-        lambda x: (x[1].hour + x[1].minute/60) - (x[0].hour + x[0].minute/60)
-    )
-    working_expanded.loc[working_expanded["Duration"] < 0, "Duration"] += 24
-    weekly_hours = working_expanded.groupby("business_id")["Duration"].sum().reset_index()
-    weekly_hours = weekly_hours.merge(df_b[["business_id", "stars"]], on="business_id")
-    weekly_hours["stars_grouped"] = np.floor(weekly_hours["stars"]).astype(int)
-    weekly_hours_clean = weekly_hours[weekly_hours["Duration"] > 0].copy()
+
+
+def build_weekly_hours(agg):
     fig = px.histogram(
-        weekly_hours_clean,
+        agg["weekly_hours"],
         x="Duration",
         color="stars_grouped",
         nbins=10,
@@ -235,20 +153,28 @@ def build_graphs():
         title="Distribution of Weekly Working Hours by Star Rating (Grouped, Cleaned)"
     )
     fig.update_layout(bargap=0.1)
-    graphs.append(fig)
+    return fig
 
+
+def build_review_ratings(agg):
+    review_stars = agg["review_stars"]
     fig = px.histogram(
-        db_r,
+        review_stars,
         x="stars",
+        y="count",
+        histfunc="sum",
         title="Distribution of Review Ratings",
         color="stars",
-        category_orders={"stars": sorted(db_r["stars"].unique())}
+        category_orders={"stars": sorted(review_stars["stars"])}
     )
-    fig.update_traces(marker_line_width=1, marker_line_color="black")
-    graphs.append(fig)
+    fig.update_traces(marker_line_width=1, marker_line_color="black",
+                      hovertemplate="stars=%{x}<br>count=%{y}<extra></extra>")
+    fig.update_yaxes(title_text="count")
+    return fig
 
-    corr = db_r[["stars", "useful", "funny", "cool"]].corr()
-    corr = corr.mask(np.triu(np.ones_like(corr, dtype=bool))).round(2)
+
+def build_engagement_corr(agg):
+    corr = agg["review_corr"].set_index("metric").rename_axis(None)
     fig = px.imshow(
         corr,
         text_auto=True,
@@ -256,11 +182,11 @@ def build_graphs():
         title="Correlation Heatmap: Stars vs Engagement"
     )
     fig.update_layout(width=800, height=600, plot_bgcolor="white")
-    graphs.append(fig)
+    return fig
 
-    db_u["date"] = pd.to_datetime(db_u["date"])
-    tips_over_time = db_u.groupby(db_u["date"].dt.to_period("M")).size().reset_index(name="tip_count")
-    tips_over_time["date"] = tips_over_time["date"].dt.to_timestamp()
+
+def build_tips_over_time(agg):
+    tips_over_time = agg["tips_over_time"]
     fig = px.line(
         tips_over_time,
         x="date",
@@ -273,24 +199,22 @@ def build_graphs():
     for date, label in events.items():
         fig.add_vline(x=date, line_dash="dash", line_color="red")
         fig.add_annotation(x=date, y=max(tips_over_time["tip_count"]), text=label, showarrow=True, arrowhead=3)
-    graphs.append(fig)
+    return fig
 
-    db_r["date"] = pd.to_datetime(db_r["date"])
-    avg_stars_per_year = db_r.groupby(db_r["date"].dt.year)["stars"].mean().reset_index()
-    fig = px.line(
-        avg_stars_per_year,
+
+def build_stars_over_time(agg):
+    return px.line(
+        agg["avg_stars_per_year"],
         x="date",
         y="stars",
         markers=True,
         title="Average Stars Over Time",
         labels={"date": "Year", "stars": "Average Stars"}
     )
-    graphs.append(fig)
 
-    features_expanded = df_b["features"].dropna().apply(pd.Series)
-    feature_sums = features_expanded.sum().astype(float)
-    avg_stars_per_feature = features_expanded.mul(df_b["stars"], axis=0).sum() / feature_sums.replace(0, np.nan)
-    avg_stars_per_feature = avg_stars_per_feature.dropna().sort_values()
+
+def build_feature_stars(agg):
+    avg_stars_per_feature = agg["avg_stars_per_feature"].set_index("feature")["avg_stars"].rename_axis(None)
     fig = px.bar(
         avg_stars_per_feature,
         x=avg_stars_per_feature.values,
@@ -302,22 +226,12 @@ def build_graphs():
         color_continuous_scale="Viridis"
     )
     fig.update_layout(coloraxis_showscale=False, plot_bgcolor="white", paper_bgcolor="white", showlegend=False)
-    graphs.append(fig)
-
-    def total_hours(working_days):
-        if pd.isna(working_days): return np.nan
-        hours = 0
-        for interval in working_days.values():
-            if interval is None: continue
-            start, end = interval if not isinstance(interval, np.ndarray) else interval
-            h = (end.hour + end.minute/60) - (start.hour + start.minute/60)
-            if h < 1: h += 24
-            hours += h
-        return hours
-
-    df_b["total_hours"] = df_b["working_days"].apply(total_hours)
-    fig = px.scatter(
-        df_b,
+    return fig
+
+
+def build_hours_vs_reviews(agg):
+    return px.scatter(
+        agg["business_points"],
         x="total_hours",
         y="review_count",
         color="stars",
@@ -326,8 +240,76 @@ def build_graphs():
         title="Total Weekly Hours vs Review Count",
         color_continuous_scale="Plasma"
     )
-    graphs.append(fig)
-    return graphs
+
+
+# Overview charts in page order, as key -> builder taking the aggregate store (the
+# maps are maps.OVERVIEW_MAPS)
+OVERVIEW_CHARTS = {
+    "review_count_box": build_review_count_box,
+    "rating_histogram": build_rating_histogram,
+    "top_franchises": build_top_franchises,
+    "feature_counts": build_feature_counts,
+    "avg_hours": build_avg_hours,
+    "weekly_hours": build_weekly_hours,
+    "review_ratings": build_review_ratings,
+    "engagement_corr": build_engagement_corr,
+    "tips_over_time": build_tips_over_time,
+    "stars_over_time": build_stars_over_time,
+    "feature_stars": build_feature_stars,
+    "hours_vs_reviews": build_hours_vs_reviews,
+}
+
+
+def build_graphs():
+    agg = load_aggregates(aggregates.dataset_version())
+    return [build_map(key, agg) for key in OVERVIEW_MAPS] + [builder(agg) for builder in OVERVIEW_CHARTS.values()]
+
+
+# Finished Overview charts are serialized to ./data/figures/<dataset version>/ as
+# styled plotly JSON. The file name carries a hash of the builder's code, so
+# editing a chart or rebuilding the data both lead to a fresh file; directories
+# of older versions are removed.
+def figure_code_hash(builder) -> str:
+    source = inspect.getsource(builder) + inspect.getsource(style_plotly)
+    return hashlib.sha256(f"{source}{CHART_HEIGHT}".encode()).hexdigest()[:12]
+
+
+def render_chart(key: str, agg) -> str:
+    fig = style_plotly(OVERVIEW_CHARTS[key](agg))
+    fig.update_layout(height=CHART_HEIGHT)
+    return fig.to_json()
+
+
+def cached_chart_json(key: str, version: str) -> str:
+    path = os.path.join(FIGURE_DIR, version, f"{key}-{figure_code_hash(OVERVIEW_CHARTS[key])}.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            return file.read()
+
+    # sessions can miss at the same time: each writes its own tmp file and renames
+    # it into place, and only the directories of other versions are removed
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    text = render_chart(key, load_aggregates(version))
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as file:
+        file.write(text)
+    os.replace(tmp, path)
+    for entry in os.listdir(FIGURE_DIR):
+        if entry != version:
+            shutil.rmtree(os.path.join(FIGURE_DIR, entry), ignore_errors=True)
+    return text
+
+
+# shared, not copied per session: the page only reads the figure
+@st.cache_resource(show_spinner=False)
+def load_chart(key: str, version: str):
+    return pio.from_json(cached_chart_json(key, version))
+
+
+@st.cache_resource(show_spinner=False)
+def load_spatial_index(version: str):
+    return registry.register("spatial index", version, spatial.build_index(load_aggregates(version)["business_points"]))
+
 
 def get_star_color(rating):
     if rating >= 4.5:
@@ -380,30 +362,23 @@ def horizontal_stars(avg_stars: float, title: str = "") -> go.Figure:
     )
     return fig
 
-def haversine(lat1, lon1, lat2, lon2):
-    R = 6371
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = sin(dlat/2)**2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon/2)**2
-    return 2 * R * atan2(sqrt(a), sqrt(1-a))
+# location index pairs of a franchise's shortest network, computed once per franchise
+@st.cache_data(show_spinner=False)
+def load_franchise_network(version: str, selected_gym: str):
+    locations, _ = franchises.franchise_slice(load_franchise_index(version), selected_gym)
+    return spatial.franchise_network(locations["latitude"].to_numpy(), locations["longitude"].to_numpy())
 
-def render_features_grid(selected_gym):
-    df_b, _, _ = load_datasets()
-    franchise_locations = df_b[df_b["name"] == selected_gym]
+# rows of df_f for these businesses, looked up through the index instead of a scan
+def features_of(df_f, business_ids):
+    positions = df_f.index.get_indexer(business_ids)
+    return df_f.iloc[positions[positions >= 0]]
 
-    features = (
-        franchise_locations["features"]
-        .dropna()
-        .apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
-    )
+def render_features_grid(selected_gym):
+    index = load_franchise_index(franchises.dataset_version())
+    franchise_locations, _ = franchises.franchise_slice(index, selected_gym)
 
-    combined_features = {}
-    for feature_dict in features:
-        for key, value in feature_dict.items():
-            if key not in combined_features:
-                combined_features[key] = value
-            else:
-                combined_features[key] = combined_features[key] or value
+    franchise_features = features_of(load_features(), franchise_locations["business_id"])
+    combined_features = franchise_features.any().to_dict() if not franchise_features.empty else {}
 
     if combined_features:
         sorted_features = dict(sorted(combined_features.items()))
@@ -440,29 +415,19 @@ def render_features_grid(selected_gym):
 
 
 def build_franchise_graphs(selected_gym: str):
-    df_b, db_r, db_u = load_datasets()
+    version = franchises.dataset_version()
+    index = load_franchise_index(version)
     figures = {}
 
-    franchise_locations = df_b[df_b["name"] == selected_gym].copy()
+    franchise_locations, _ = franchises.franchise_slice(index, selected_gym)
 
     lats = franchise_locations["latitude"].values
     lons = franchise_locations["longitude"].values
-    n = len(lats)
-
-    G = nx.Graph()
-    for i in range(n):
-        for j in range(i + 1, n):
-            dist = haversine(lats[i], lons[i], lats[j], lons[j])
-            G.add_edge(i, j, weight=dist)
 
-    mst = nx.minimum_spanning_tree(G)
-
-    line_lats = []
-    line_lons = []
-    for edge in mst.edges():
-        i, j = edge
-        line_lats.extend([lats[i], lats[j], None])
-        line_lons.extend([lons[i], lons[j], None])
+    edges = load_franchise_network(version, selected_gym)
+    gaps = np.full(len(edges), None)
+    line_lats = np.column_stack([lats[edges[:, 0]], lats[edges[:, 1]], gaps]).ravel().tolist()
+    line_lons = np.column_stack([lons[edges[:, 0]], lons[edges[:, 1]], gaps]).ravel().tolist()
 
     hover_text = franchise_locations.apply(
         lambda row: f"<b>{row['name']}</b><br>⭐ {row['stars']} Stars<br>{row['address']}",
@@ -532,18 +497,14 @@ def build_franchise_graphs(selected_gym: str):
 
     # 3. Ratings
     
-    franchise_reviews = db_r[db_r["business_id"].isin(franchise_locations["business_id"])].copy()
-    franchise_reviews["date"] = pd.to_datetime(franchise_reviews["date"], errors="coerce")
-
-    monthly_trend = (
-        franchise_reviews
-        .groupby(franchise_reviews["date"].dt.to_period("M"))
-        .agg(avg_stars=("stars", "mean"), review_count=("review_id", "count"))
-        .reset_index()
-    )
-
-    monthly_trend["date"] = monthly_trend["date"].astype(str)
-    monthly_trend["rolling_avg"] = monthly_trend["avg_stars"].rolling(window=3, min_periods=1).mean()
+    # straight from the precomputed monthly rollup (see franchises.py)
+    trend = franchises.franchise_trend(index, selected_gym)
+    monthly_trend = pd.DataFrame({
+        "date": trend["month"].dt.strftime("%Y-%m"),
+        "avg_stars": trend["avg_stars"],
+        "review_count": trend["review_count"],
+        "rolling_avg": trend["rolling_avg"],
+    })
 
     trend_fig = px.line(
         monthly_trend,
@@ -598,23 +559,13 @@ def build_franchise_graphs(selected_gym: str):
     figures["ratings_over_time"] = trend_fig
 
     # 4. Hist
-    features = (
-        franchise_locations["features"]
-        .dropna()
-        .apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
-    )
-
-    feature_counts = Counter()
-
-    for feature_dict in features:
-        for key, value in feature_dict.items():
-            if value:
-                feature_counts[key] += 1
+    feature_counts = features_of(load_features(), franchise_locations["business_id"]).sum()
+    feature_counts = feature_counts[feature_counts > 0]
 
-    if feature_counts:
+    if not feature_counts.empty:
         feature_df = pd.DataFrame({
-            "Feature": list(feature_counts.keys()),
-            "Count": list(feature_counts.values())
+            "Feature": feature_counts.index,
+            "Count": feature_counts.values
         }).sort_values(by="Count", ascending=True)
 
         feature_fig = px.bar(
@@ -1,31 +1,13 @@
 import streamlit as st
 from streamlit_folium import st_folium
-import folium
-from pages.graphs import build_graphs
+import aggregates
+import spatial
+from maps import OVERVIEW_MAPS, MAP_CENTER, MAP_ZOOM, base_map, map_layer
+from pages.graphs import OVERVIEW_CHARTS, CHART_HEIGHT, load_aggregates, load_spatial_index, load_chart
 
 st.set_page_config(layout="wide")
 st.header("📊 Overview")
 
-graphs = build_graphs()
-
-def style_plotly(fig, bgcolor="#262730", font_color="white"):
-    fig.update_layout(
-        plot_bgcolor=bgcolor,
-        paper_bgcolor=bgcolor,
-        font_color=font_color,
-        title_font_color=font_color,
-        legend_font_color=font_color,
-        xaxis=dict(
-            color=font_color,
-            gridcolor="#444444"
-        ),
-        yaxis=dict(
-            color=font_color,
-            gridcolor="#444444"
-        )
-    )
-    return fig
-
 # def show_graphs(graphs):
 #     folium_names = ["📍 Gym Locations in Florida by Star Rating", "⭐️ Clustered Gym Locations by Reviews and Ratings",
 #                     "🔥 Heatmap of Gym Density in Florida", "💬 Distribution of Reviews Across Gyms"]
@@ -42,21 +24,36 @@ def style_plotly(fig, bgcolor="#262730", font_color="white"):
 #         with target_col:
 #             st.plotly_chart(chart, use_container_width=True, key=f"plot_{i}")
 
-def show_graphs(graphs):
+# every figure is loaded (or built and cached on disk) right before it is drawn,
+# so the first map shows up without waiting for the rest of the page. Maps only
+# get the gyms inside the bounds st_folium reported on the last rerun; panning or
+# zooming replaces that layer without reloading the base map.
+# The base map and layer are rebuilt on every rerun rather than cached: st_folium
+# adds the layer to the map it is given and renders it, so a shared map would carry
+# the previous rerun's layer (and be mutated by concurrent sessions). A viewport
+# holds at most spatial.MAX_POINTS gyms, so the rebuild stays around 20-40 ms per map.
+def show_graphs(version):
     folium_names = [
         "📍 Gym Locations in Florida by Star Rating",
         "⭐️ Clustered Gym Locations by Reviews and Ratings",
         "🔥 Heatmap of Gym Density in Florida",
         "🗺️ Gym Locations in Florida by Number of Reviews"
     ]
-    folium_maps = [g for g in graphs if isinstance(g, folium.Map)]
-    for i, m in enumerate(folium_maps):
-        st.subheader(folium_names[i])
-        st_folium(m, width=None, height=600, use_container_width=True, key=f"map_{i}")
+    agg = load_aggregates(version)
+    index = load_spatial_index(version)
+    for name, key in zip(folium_names, OVERVIEW_MAPS):
+        st.subheader(name)
+        state = st.session_state.get(f"map_{key}") or {}
+        zoom = state.get("zoom") or MAP_ZOOM
+        bounds = spatial.viewport(state.get("bounds"), MAP_CENTER, zoom)
+        st_folium(
+            base_map(key, agg),
+            feature_group_to_add=map_layer(key, agg, index, bounds, zoom),
+            returned_objects=["bounds", "zoom"],
+            width=None, height=600, use_container_width=True, key=f"map_{key}"
+        )
         st.markdown("---")
 
-    plotly_charts = [g for g in graphs if not isinstance(g, folium.Map)]
-
     chart_texts = [
         "Gyms with mid-range ratings (2.5–3 stars) have the widest variation in review counts, while 5-star gyms tend to have fewer reviews overall, with only a few highly popular outliers.",
         "Most gyms have ratings above 3 stars, with 5-star ratings being the most common.",
@@ -72,8 +69,6 @@ def show_graphs(graphs):
         "Gyms with very high weekly hours don’t always get more reviews, but some outliers stand out in popularity."
     ]
 
-    CHART_HEIGHT = 520
-
     def vcenter_text(text, height=CHART_HEIGHT, font_size=34):
         return f"""
             <div style="
@@ -89,25 +84,23 @@ def show_graphs(graphs):
             </div>
         """
 
-    for i, chart in enumerate(plotly_charts):
-        chart = style_plotly(chart)
-        chart.update_layout(height=CHART_HEIGHT)
+    for i, key in enumerate(OVERVIEW_CHARTS):
         col1, col2 = st.columns(2)
 
         text_block = vcenter_text(chart_texts[i] if i < len(chart_texts) else "")
 
         if i % 2 == 0:
             with col1:
-                st.plotly_chart(chart, use_container_width=True, key=f"plot_{i}")
+                st.plotly_chart(load_chart(key, version), use_container_width=True, key=f"plot_{i}")
             with col2:
                 st.markdown(text_block, unsafe_allow_html=True)
         else:      
             with col1:
                 st.markdown(text_block, unsafe_allow_html=True)
             with col2:
-                st.plotly_chart(chart, use_container_width=True, key=f"plot_{i}")
+                st.plotly_chart(load_chart(key, version), use_container_width=True, key=f"plot_{i}")
 
         st.markdown("---")
 
         
-show_graphs(graphs)
+show_graphs(aggregates.dataset_version())
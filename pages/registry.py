@@ -0,0 +1,124 @@
+import os
+import sys
+import threading
+from typing import Any, Dict, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import streamlit as st
+
+import columnar
+
+# Process-wide registry of the datasets the pages read. Each table is read once
+# per server process (st.cache_resource, keyed by the file's size and mtime) as an
+# immutable Arrow table, and its pandas view is built once from it, so every
+# session gets the same objects instead of a pickled copy per call. Pages must
+# treat them as read-only (take a shallow copy before adding columns).
+# Tables export.py also wrote as Arrow IPC (export.IPC_TABLES) are memory-mapped
+# rather than decoded: opening them is instant, and the Arrow buffers are page
+# cache shared by every process on the host. A Parquet file newer than its IPC
+# copy is read instead.
+# Everything loaded through here is recorded for resident(); when a file is
+# rebuilt, the cached tables of the older version are dropped.
+
+_RESIDENT: Dict[str, Dict[str, Any]] = {}
+_TABLES: set = set() # names registered by the table loaders below
+_LOCK = threading.Lock()
+
+def ipc_path(table: str) -> str:
+    return os.path.join(columnar.DATA_DIR, f"{table}.arrow")
+
+# the file a table is loaded from: its IPC copy unless the Parquet file is newer
+def source_path(table: str) -> str:
+    parquet, ipc = columnar.parquet_path(table), ipc_path(table)
+    if os.path.exists(ipc) and os.stat(ipc).st_mtime_ns >= os.stat(parquet).st_mtime_ns:
+        return ipc
+    return parquet
+
+def file_version(table: str) -> str:
+    path = source_path(table)
+    stat = os.stat(path)
+    return f"{os.path.basename(path)}:{stat.st_size}-{stat.st_mtime_ns}"
+
+# records `value` as the resident copy of `name` (replacing older versions) and
+# returns it; its size is measured here, once per version, since a deep
+# memory_usage of every frame on each rerun of resident() costs seconds
+def register(name: str, version: str, value: Any, source: str = "memory") -> Any:
+    entry = {"version": version, "value": value, "source": source, "rows": rows(value), "nbytes": nbytes(value)}
+    with _LOCK:
+        _RESIDENT[name] = entry
+    return value
+
+def is_stale(name: str, version: str) -> bool:
+    with _LOCK:
+        return name in _RESIDENT and _RESIDENT[name]["version"] != version
+
+def label(table: str, columns: tuple | None) -> str:
+    return table if columns is None else f"{table}[{', '.join(columns)}]"
+
+@st.cache_resource(show_spinner=False)
+def _arrow(table: str, version: str, columns: tuple | None) -> pa.Table:
+    path = source_path(table)
+    if path.endswith(".arrow"):
+        data = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        data = data.select(list(columns)) if columns else data
+        source = "mmap"
+    else:
+        data = pq.read_table(path, columns=list(columns) if columns else None)
+        source = "parquet"
+    _TABLES.add(label(table, columns))
+    return register(label(table, columns), version, data, source)
+
+@st.cache_resource(show_spinner=False)
+def _frame(table: str, version: str, columns: tuple | None) -> pd.DataFrame:
+    # split_blocks lets numeric columns without nulls share the Arrow buffers
+    data = _arrow(table, version, columns).to_pandas(split_blocks=True)
+    _TABLES.add(f"{label(table, columns)} (pandas)")
+    return register(f"{label(table, columns)} (pandas)", version, data)
+
+def current(table: str, columns: List[str] | None) -> tuple:
+    version, columns = file_version(table), tuple(columns) if columns else None
+    if is_stale(label(table, columns), version):
+        _arrow.clear()
+        _frame.clear()
+        with _LOCK:
+            for name in _TABLES:
+                _RESIDENT.pop(name, None)
+    return table, version, columns
+
+def arrow_table(table: str, columns: List[str] | None = None) -> pa.Table:
+    return _arrow(*current(table, columns))
+
+def frame(table: str, columns: List[str] | None = None) -> pd.DataFrame:
+    return _frame(*current(table, columns))
+
+def nbytes(value: Any) -> int:
+    if isinstance(value, pa.Table):
+        return value.nbytes
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, dict):
+        return sum(nbytes(item) for item in value.values())
+    return sys.getsizeof(value)
+
+def rows(value: Any) -> int | None:
+    if isinstance(value, (pa.Table, pd.DataFrame)):
+        return len(value)
+    return None
+
+# one row per resident dataset with its size; "mmap" tables are mapped file pages
+# shared with other processes, not heap memory of this one
+def resident() -> pd.DataFrame:
+    with _LOCK:
+        entries = list(_RESIDENT.items())
+    return pd.DataFrame({
+        "dataset": [name for name, _ in entries],
+        "source": [entry["source"] for _, entry in entries],
+        "version": [entry["version"] for _, entry in entries],
+        "rows": pd.array([entry["rows"] for _, entry in entries], dtype="Int64"),
+        "MB": [round(entry["nbytes"] / 2**20, 2) for _, entry in entries],
+    })
+
+def arrow_allocated_mb() -> float:
+    return round(pa.total_allocated_bytes() / 2**20, 2)
@@ -0,0 +1,257 @@
+import os
+import json
+import sqlite3
+import runpy
+import hashlib
+import inspect
+import argparse
+from typing import Any, Callable, Dict, List
+
+import jsons
+import processing
+import export
+import schemas
+import aggregates
+import columnar
+import franchises
+import ngrams
+import cleantext
+import embeddings
+import ann
+
+# Incremental rebuild: ingest -> prune -> export -> merge -> aggregates -> franchises -> nlp -> embeddings.
+# Every stage is fingerprinted from its code, its input files and the fingerprint
+# of the stage it depends on; a stage whose fingerprint and outputs are unchanged is skipped, and
+# a stage that crashed resumes (ingest from its last committed batch, export from
+# its last finished table). Unlike the Makefile, gyms.db is kept between runs so a
+# change to the merges never forces a JSON re-ingest.
+# Usage: python pipeline.py [--force STAGE ...] [--florida-gyms] [--parallel] [--profile bulk]
+
+STATE_FILE = "./data/pipeline_state.json"
+HASH_CHUNK = 1 << 20
+
+EXPORT_TABLES = ["review", "user", "tip"]
+BUSINESS_TABLES = ["business", "business_categories", "business_attributes", "business_hours"]
+
+def load_state() -> Dict[str, Any]:
+    if not os.path.exists(STATE_FILE):
+        return {"files": {}, "stages": {}}
+    with open(STATE_FILE) as file:
+        return json.load(file)
+
+def save_state(state: Dict[str, Any]) -> None:
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as file:
+        json.dump(state, file, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+# content hash of a file, cached on (size, mtime) so the multi-GB dumps are only
+# read again when they actually change
+def file_digest(path: str, state: Dict[str, Any]) -> str:
+    stat = os.stat(path)
+    cached = state["files"].get(path)
+    if cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime_ns:
+        return cached["sha256"]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(HASH_CHUNK):
+            digest.update(chunk)
+    state["files"][path] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+    return digest.hexdigest()
+
+# code items: a path is hashed by content, a function/module by its source, anything
+# else (constants such as column lists) by its repr
+def fingerprint(name: str, code: List[Any], inputs: List[str], upstream: str, options: Dict[str, Any],
+                state: Dict[str, Any]) -> str:
+    digest = hashlib.sha256(f"{name}:{upstream}:{sorted(options.items())}".encode())
+    for item in code:
+        if isinstance(item, str):
+            digest.update(file_digest(item, state).encode())
+        elif inspect.isfunction(item) or inspect.ismodule(item):
+            digest.update(inspect.getsource(item).encode())
+        else:
+            digest.update(repr(item).encode())
+    for path in inputs:
+        digest.update(file_digest(path, state).encode())
+    return digest.hexdigest()
+
+# Stage runners get the progress items checkpointed by an interrupted run of the
+# same stage (empty on a fresh run) and a callback that persists a new item.
+
+def run_ingest(progress: List[str], checkpoint: Callable[[str], None], options: Dict[str, Any]) -> None:
+    # a fresh ingest (or a parallel one, which has no checkpoints) starts from an
+    # empty database, a resumed one continues from the offsets stored in it
+    if (not progress or options["parallel"]) and os.path.exists(jsons.DB_NAME):
+        os.remove(jsons.DB_NAME)
+    checkpoint("started")
+    jsons.transform_json_to_sql(parallel=options["parallel"], florida_gyms=options["florida_gyms"],
+                                profile=options["profile"])
+
+def run_prune(progress: List[str], checkpoint: Callable[[str], None], options: Dict[str, Any]) -> None:
+    # a --florida-gyms load already holds only the rows the prune would keep
+    if options["florida_gyms"]:
+        print("Ingest was filtered to Florida gyms, nothing to prune")
+        return
+    processing.main()
+
+def run_export(progress: List[str], checkpoint: Callable[[str], None], options: Dict[str, Any]) -> None:
+    con = sqlite3.connect(export.DB)
+    for table in EXPORT_TABLES:
+        if table in progress:
+            print(f"{table} already exported, skipping")
+            continue
+        print(f"Exporting {table}...")
+        row_group_size = export.SORTED_ROW_GROUP_SIZE if table in export.SORTED_TABLES else export.ROW_GROUP_SIZE
+        export.export_table(con, table, f"./data/{table}.parquet", row_group_size=row_group_size)
+        if table in export.IPC_TABLES:
+            export.write_ipc(table)
+        checkpoint(table)
+    con.close()
+
+def run_merge(progress: List[str], checkpoint: Callable[[str], None], options: Dict[str, Any]) -> None:
+    # the merges need the raw business tables, which are cheap to re-export from the pruned database
+    con = sqlite3.connect(export.DB)
+    for table in BUSINESS_TABLES:
+        export.export_table(con, table, f"./data/{table}.parquet")
+    con.close()
+    export.merge_business_hours()
+    export.merge_business_attr()
+    export.finalize_business()
+
+def run_aggregates(progress: List[str], checkpoint: Callable[[str], None], options: Dict[str, Any]) -> None:
+    aggregates.build_store()
+
+def run_franchises(progress: List[str], checkpoint: Callable[[str], None], options: Dict[str, Any]) -> None:
+    franchises.build_store()
+
+def run_nlp(progress: List[str], checkpoint: Callable[[str], None], options: Dict[str, Any]) -> None:
+    os.makedirs("./data/outputs_nlp", exist_ok=True)
+    runpy.run_path("nlp.py", run_name="__main__")
+
+def run_embeddings(progress: List[str], checkpoint: Callable[[str], None], options: Dict[str, Any]) -> None:
+    for table in embeddings.TABLES:
+        if table not in progress:
+            embeddings.build_store(table)
+            ann.build_index(table)
+            checkpoint(table)
+
+# name -> (stage it depends on, code, input files, outputs, runner)
+STAGES: Dict[str, tuple] = {
+    "ingest": (
+        None,
+        [jsons],
+        [path for path, _, _ in jsons.SOURCES.values()],
+        [jsons.DB_NAME],
+        run_ingest,
+    ),
+    "prune": (
+        "ingest",
+        [processing],
+        [],
+        [processing.DB],
+        run_prune,
+    ),
+    "export": (
+        "prune",
+        [export.export_table, schemas, EXPORT_TABLES, export.SORTED_TABLES, export.SORTED_ROW_GROUP_SIZE,
+         export.IPC_TABLES, export.write_ipc],
+        [],
+        [f"./data/{table}.parquet" for table in EXPORT_TABLES] + [f"./data/{table}.arrow" for table in export.IPC_TABLES],
+        run_export,
+    ),
+    "merge": (
+        "prune",
+        [export.export_table, schemas, export.WEEKDAYS, export.hours_to_wide, export.working_days_column,
+         export.merge_business_hours, export.DROPPED_ATTRIBUTES, export.normalize_attributes,
+         export.attributes_to_wide, export.features_column, export.merge_business_attr,
+         export.finalize_business],
+        [],
+        ["./data/business.parquet", "./data/business_features.parquet"],
+        run_merge,
+    ),
+    # its inputs are the Parquet files themselves, so it follows both export and merge
+    "aggregates": (
+        "merge",
+        [aggregates],
+        aggregates.INPUTS,
+        [aggregates.AGG_DIR],
+        run_aggregates,
+    ),
+    "franchises": (
+        "merge",
+        [franchises],
+        franchises.INPUTS,
+        [franchises.FRANCHISE_DIR],
+        run_franchises,
+    ),
+    "nlp": (
+        "export",
+        ["nlp.py", columnar, ngrams, cleantext],
+        [],
+        [f"./data/outputs_nlp/wc_{name}_all.png" for name in ("bad", "good")] + [cleantext.CLEAN_DIR],
+        run_nlp,
+    ),
+    "embeddings": (
+        "export",
+        [embeddings, ann],
+        [columnar.parquet_path(table) for table in embeddings.TABLES],
+        [embeddings.pointer_path(table) for table in embeddings.TABLES],
+        run_embeddings,
+    ),
+}
+
+# options that change what a stage produces and therefore its fingerprint
+STAGE_OPTIONS = {"ingest": ["florida_gyms"]}
+
+def run_pipeline(force: List[str] | None = None, parallel: bool = False, florida_gyms: bool = False,
+                 profile: str = "default") -> None:
+    force = force or []
+    options = {"parallel": parallel, "florida_gyms": florida_gyms, "profile": profile}
+    os.makedirs("./data", exist_ok=True)
+    state = load_state()
+    fingerprints: Dict[str, str] = {}
+
+    for name, (upstream, code, inputs, outputs, runner) in STAGES.items():
+        stage_options = {key: options[key] for key in STAGE_OPTIONS.get(name, [])}
+        fp = fingerprint(name, code, inputs, fingerprints.get(upstream, ""), stage_options, state)
+        fingerprints[name] = fp
+        entry = state["stages"].get(name, {})
+
+        if (entry.get("fingerprint") == fp and entry.get("status") == "done"
+                and name not in force and all(map(os.path.exists, outputs))):
+            print(f"[{name}] up to date, skipping")
+            continue
+
+        resume = entry.get("fingerprint") == fp and entry.get("status") == "running" and name not in force
+        progress = entry.get("progress", []) if resume else []
+        print(f"[{name}] {'resuming' if resume else 'running'}")
+
+        state["stages"][name] = {"fingerprint": fp, "status": "running", "progress": list(progress)}
+        save_state(state)
+
+        def checkpoint(item: str, name: str = name) -> None:
+            state["stages"][name]["progress"].append(item)
+            save_state(state)
+
+        runner(progress, checkpoint, options)
+        state["stages"][name]["status"] = "done"
+        save_state(state)
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Rebuild the dashboard data, skipping stages whose inputs did not change")
+    parser.add_argument("--force", nargs="*", default=[], choices=list(STAGES),
+                        help="stages to rerun even when their fingerprint is unchanged")
+    parser.add_argument("--parallel", action="store_true", help="use the parallel JSON loader for ingest")
+    parser.add_argument("--florida-gyms", action="store_true", help="filter to Florida gyms while ingesting")
+    parser.add_argument("--profile", choices=list(jsons.PROFILES), default="default",
+                        help="SQLite settings for ingest (see jsons.PROFILES)")
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    run_pipeline(force=args.force, parallel=args.parallel, florida_gyms=args.florida_gyms, profile=args.profile)
+    return 0
+
+if __name__ == "__main__":
+    print("exit code:", main())
@@ -0,0 +1,74 @@
+import pyarrow as pa
+
+# Arrow versions of the tables created by jsons.create_db (same column order),
+# TEXT -> string, REAL -> float64, INTEGER -> int64
+SCHEMAS = {
+    "business": pa.schema([
+        ("business_id", pa.string()),
+        ("name", pa.string()),
+        ("address", pa.string()),
+        ("city", pa.string()),
+        ("state", pa.string()),
+        ("postal_code", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("stars", pa.float64()),
+        ("review_count", pa.int64()),
+        ("is_open", pa.int64()),
+    ]),
+    "business_attributes": pa.schema([
+        ("business_id", pa.string()),
+        ("attr_key", pa.string()),
+        ("attr_value", pa.string()),
+    ]),
+    "business_categories": pa.schema([
+        ("business_id", pa.string()),
+        ("category", pa.string()),
+    ]),
+    "business_hours": pa.schema([
+        ("business_id", pa.string()),
+        ("day", pa.string()),
+        ("open_close", pa.string()),
+    ]),
+    "review": pa.schema([
+        ("review_id", pa.string()),
+        ("user_id", pa.string()),
+        ("business_id", pa.string()),
+        ("stars", pa.int64()),
+        ("date", pa.string()),
+        ("text", pa.string()),
+        ("useful", pa.int64()),
+        ("funny", pa.int64()),
+        ("cool", pa.int64()),
+    ]),
+    "user": pa.schema([
+        ("user_id", pa.string()),
+        ("name", pa.string()),
+        ("review_count", pa.int64()),
+        ("yelping_since", pa.string()),
+        ("useful", pa.int64()),
+        ("funny", pa.int64()),
+        ("cool", pa.int64()),
+        ("fans", pa.int64()),
+        ("average_stars", pa.float64()),
+        ("compliment_hot", pa.int64()),
+        ("compliment_more", pa.int64()),
+        ("compliment_profile", pa.int64()),
+        ("compliment_cute", pa.int64()),
+        ("compliment_list", pa.int64()),
+        ("compliment_note", pa.int64()),
+        ("compliment_plain", pa.int64()),
+        ("compliment_cool", pa.int64()),
+        ("compliment_funny", pa.int64()),
+        ("compliment_writer", pa.int64()),
+        ("compliment_photos", pa.int64()),
+    ]),
+    "tip": pa.schema([
+        ("tip_id", pa.int64()),
+        ("text", pa.string()),
+        ("date", pa.string()),
+        ("compliment_count", pa.int64()),
+        ("business_id", pa.string()),
+        ("user_id", pa.string()),
+    ]),
+}
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree
+from scipy.spatial import Delaunay, QhullError
+from shapely.geometry import box
+
+# Viewport queries over the business points for the Overview maps. Points live in
+# a GeoDataFrame whose R-tree (geopandas sindex) answers bounding-box queries;
+# when a viewport holds more than MAX_POINTS gyms, the map gets per-cell counts
+# from a grid pyramid (one level per zoom) instead, so the browser only ever
+# receives what the current view can show.
+
+MAX_POINTS = 2_000
+MAX_ZOOM = 18
+CELL_PIXELS = 64 # on-screen size of a cluster cell
+
+# assumed viewport before the map reports its real bounds
+DEFAULT_VIEWPORT_PIXELS = (1200, 600)
+
+def cell_size(zoom: int) -> float:
+    return 360 / 2 ** zoom * CELL_PIXELS / 256
+
+def grid_cells(points: pd.DataFrame, zoom: int) -> pd.DataFrame:
+    size = cell_size(zoom)
+    cells = pd.DataFrame({
+        "cell_lat": np.floor(points["latitude"].to_numpy() / size).astype("int64"),
+        "cell_lon": np.floor(points["longitude"].to_numpy() / size).astype("int64"),
+        "latitude": points["latitude"].to_numpy(),
+        "longitude": points["longitude"].to_numpy(),
+        "stars": points["stars"].to_numpy(),
+        "review_count": points["review_count"].to_numpy(),
+    })
+    return cells.groupby(["cell_lat", "cell_lon"], as_index=False).agg(
+        count=("stars", "size"),
+        latitude=("latitude", "mean"),
+        longitude=("longitude", "mean"),
+        stars=("stars", "mean"),
+        review_count=("review_count", "sum"),
+    )
+
+def build_index(points: pd.DataFrame) -> dict:
+    gdf = gpd.GeoDataFrame(
+        points.reset_index(drop=True),
+        geometry=gpd.points_from_xy(points["longitude"], points["latitude"])
+    )
+    gdf.sindex # build the R-tree now, not on the first query
+    return {
+        "points": gdf,
+        "cells": {zoom: grid_cells(points, zoom) for zoom in range(MAX_ZOOM + 1)},
+    }
+
+# st_folium bounds ({"_southWest": {"lat", "lng"}, "_northEast": {...}}) -> (west, south, east, north)
+def viewport(bounds: dict | None, center: list, zoom: int) -> tuple:
+    if bounds and bounds.get("_southWest", {}).get("lat") is not None:
+        sw, ne = bounds["_southWest"], bounds["_northEast"]
+        return sw["lng"], sw["lat"], ne["lng"], ne["lat"]
+    degrees_per_pixel = 360 / (256 * 2 ** zoom)
+    half_width, half_height = (pixels * degrees_per_pixel / 2 for pixels in DEFAULT_VIEWPORT_PIXELS)
+    return center[1] - half_width, center[0] - half_height, center[1] + half_width, center[0] + half_height
+
+# -> ("points", business rows) or ("clusters", grid cells with count/mean position)
+def query_viewport(index: dict, bounds: tuple, zoom: int) -> tuple[str, pd.DataFrame]:
+    west, south, east, north = bounds
+    gdf = index["points"]
+    hits = np.sort(gdf.sindex.query(box(west, south, east, north)))
+    if len(hits) <= MAX_POINTS:
+        return "points", pd.DataFrame(gdf.iloc[hits].drop(columns="geometry"))
+
+    cells = index["cells"][int(min(max(zoom, 0), MAX_ZOOM))]
+    inside = cells["latitude"].between(south, north) & cells["longitude"].between(west, east)
+    return "clusters", cells[inside]
+
+
+# Franchise networks: the minimum spanning tree of a franchise's locations under
+# great-circle distance. Up to DENSE_MST_MAX distinct locations the tree comes from
+# the full distance matrix; above that only from the Delaunay edges of the
+# locations (projected around their mean latitude), which hold the tree for
+# planar distances and keep the graph O(n).
+
+EARTH_RADIUS_KM = 6371
+DENSE_MST_MAX = 200
+
+def haversine_pairs(lats: np.ndarray, lons: np.ndarray, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    lat1, lat2 = np.radians(lats[i]), np.radians(lats[j])
+    dlat, dlon = lat2 - lat1, np.radians(lons[j] - lons[i])
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def haversine_matrix(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    i, j = np.triu_indices(len(lats), k=1)
+    distances = np.zeros((len(lats), len(lats)))
+    distances[i, j] = haversine_pairs(lats, lons, i, j)
+    return distances
+
+def delaunay_edges(lats: np.ndarray, lons: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    points = np.column_stack([lons * np.cos(np.radians(lats.mean())), lats])
+    simplices = Delaunay(points).simplices
+    edges = np.sort(simplices[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    edges = np.unique(edges, axis=0)
+    return edges[:, 0], edges[:, 1]
+
+def spanning_edges(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    n = len(lats)
+    if n > DENSE_MST_MAX:
+        try:
+            i, j = delaunay_edges(lats, lons)
+            graph = coo_matrix((haversine_pairs(lats, lons, i, j), (i, j)), shape=(n, n))
+        except QhullError: # collinear locations
+            graph = haversine_matrix(lats, lons)
+    else:
+        graph = haversine_matrix(lats, lons)
+    tree = minimum_spanning_tree(graph).tocoo()
+    return np.column_stack([tree.row, tree.col])
+
+# location index pairs of the network; repeated coordinates are joined to their
+# first occurrence (csgraph reads a zero distance as a missing edge)
+def franchise_network(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    lats, lons = np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+    if len(lats) < 2:
+        return np.empty((0, 2), dtype="int64")
+    unique, first, inverse = np.unique(np.column_stack([lats, lons]), axis=0, return_index=True, return_inverse=True)
+    edges = first[spanning_edges(unique[:, 0], unique[:, 1])]
+    repeated = np.flatnonzero(first[inverse.ravel()] != np.arange(len(lats)))
+    return np.concatenate([edges, np.column_stack([first[inverse.ravel()][repeated], repeated])]).astype("int64")
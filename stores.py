@@ -0,0 +1,52 @@
+import os
+import shutil
+import hashlib
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+# Versioned on-disk stores of the offline stages (aggregates.py, franchises.py,
+# cleantext.py, embeddings.py). A store is a directory <root>/<version>/ whose
+# version hashes the size and mtime of the stage's inputs plus the code of the
+# module that builds it, so rebuilding the data or changing the stage starts a
+# new one. It is written into <version>.tmp and renamed once complete, so readers
+# never see half a store, and the directories of older versions are then removed.
+
+# `code` is the module whose output is versioned
+def dataset_version(inputs: List[str], code: str) -> str:
+    digest = hashlib.sha256()
+    for path in inputs:
+        stat = os.stat(path)
+        digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(code, "rb") as file:
+        digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+# fills root/<version>/ by calling `write` on an empty temp dir, renames it into
+# place and drops the directories of older versions under root
+def write_version(root: str, version: str, write: Callable[[str], None]) -> str:
+    target = os.path.join(root, version)
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    write(tmp)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+    for entry in os.listdir(root):
+        if entry != version:
+            shutil.rmtree(os.path.join(root, entry), ignore_errors=True)
+    return target
+
+# writes `tables` as root/<version>/<name>.parquet
+def write_store(root: str, version: str, tables: Dict[str, pd.DataFrame]) -> str:
+    def write(tmp: str) -> None:
+        for name, df in tables.items():
+            df.to_parquet(os.path.join(tmp, f"{name}.parquet"), index=False)
+    return write_version(root, version, write)
+
+def read_store(target: str) -> Dict[str, pd.DataFrame]:
+    return {
+        entry.removesuffix(".parquet"): pd.read_parquet(os.path.join(target, entry))
+        for entry in os.listdir(target) if entry.endswith(".parquet")
+    }
@@ -1,11 +1,9 @@
 import streamlit as st
-import pandas as pd
 import plotly.graph_objects as go
-import plotly.express as px
 
-df_b = pd.read_parquet("./data/business.parquet")
-db_r = pd.read_parquet("./data/review.parquet")
-db_u = pd.read_parquet("./data/tip.parquet")
+from pages import registry
+
+df_b = registry.frame("business", ["name", "address", "latitude", "longitude", "stars"])
 
 franchise_counts = df_b["name"].value_counts()
 franchises = franchise_counts[franchise_counts >= 3].index.tolist()